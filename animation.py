@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+Animations of Taylor bundles.
+
+An `Animation` renders a `TaylorBundle` for a number of frames, with some
+of its options given as functions of the time of the frame, e.g. the
+offset of a trochoid's rolling circle:
+
+    anim = Animation( bundle, 600
+                    , curve = lambda t: curve.Trochoid(-4, 1./3, tau*t) )
+    anim.render()
+
+The frames are rendered in a pool of processes, each taking runs of
+consecutive frames, so that a process can reuse the layers (see
+`TaylorBundle.keep_layers`) and the cache of the frame before. The
+frames are saved as a numbered sequence of images, or written in order
+to a pipe as raw video, one at a time.
+
+@author rmj86
+"""
+
+import copy
+import subprocess
+import multiprocessing
+import image
+
+
+class Animation(object):
+    """ `n_frames` frames of `bundle`, with the options `options` given as
+        functions of the frames' times t = i/n_frames in [0, 1). The
+        frames are rendered in `workers` processes, `chunk` consecutive
+        frames at a time (by default about a quarter of each worker's
+        share). """
+    def __init__(self, bundle, n_frames, workers=1, chunk=None, filename=None, **options):
+        self.bundle = bundle
+        self.n_frames = n_frames
+        self.workers = workers
+        self.chunk = chunk
+        self.filename = bundle.filename if filename is None else filename
+        self.options = options
+    def time(self, i):
+        return i / float(self.n_frames)
+    def frameOptions(self, i):
+        """ the values of the animated options in frame i """
+        t = self.time(i)
+        return dict((name, f(t)) for name, f in self.options.items())
+    def frameFilename(self, i):
+        """ the file name of frame i, without extension """
+        digits = len(str(max(0, self.n_frames-1)))
+        return "{}_{:0{}d}".format(self.filename, i, digits)
+    def framePattern(self):
+        """ the printf style pattern of the file names, e.g. for ffmpeg """
+        digits = len(str(max(0, self.n_frames-1)))
+        return "{}_%0{}d.png".format(self.filename, digits)
+    def renderFrame(self, bundle, i, save=True):
+        """ render frame i with `bundle`, which is changed to its options.
+            Saves the image, or returns it as an array of uint8. """
+        bundle.set_options(**self.frameOptions(i))
+        if save:
+            bundle.set_options(filename=self.frameFilename(i))
+            bundle.render()
+            return None
+        return image.toBytes(bundle.renderImage())
+    def frameBundle(self):
+        """ the bundle a process renders its frames with. The frames are
+            rendered in parallel, not their partials. """
+        bundle = copy.copy(self.bundle)
+        bundle.set_options(workers=1, keep_layers=True)
+        return bundle
+    def chunkSize(self):
+        if self.chunk is not None:
+            return self.chunk
+        return max(1, self.n_frames // (4*self.workers))
+    def render(self, pipe=None):
+        """ render all frames. Without `pipe` they are saved as numbered
+            images (see `frameFilename`). Otherwise the frames are written
+            to the file object `pipe` as raw rgba bytes, in order, e.g. to
+            the stdin of `ffmpeg` (see `ffmpeg`). """
+        save = pipe is None
+        if self.workers > 1:
+            pool = multiprocessing.Pool(self.workers, _initWorker, (self, save))
+            try:
+                frames = pool.imap(_renderFrame, range(self.n_frames), self.chunkSize())
+                for frame in frames:
+                    if not save:
+                        pipe.write(frame.tobytes())
+                pool.close()
+            except:
+                pool.terminate()
+                raise
+            finally:
+                pool.join()
+        else:
+            bundle = self.frameBundle()
+            for i in range(self.n_frames):
+                frame = self.renderFrame(bundle, i, save)
+                if not save:
+                    pipe.write(frame.tobytes())
+    def ffmpeg(self, fname, fps=30, args=()):
+        """ render the frames into the video file `fname` with ffmpeg,
+            which must be on the path """
+        fig = self.bundle.initializeFigure(self.bundle.figsize)
+        (w, h) = fig.canvas.get_width_height()
+        command = ( [ "ffmpeg", "-y", "-f", "rawvideo", "-pix_fmt", "rgba"
+                    , "-s", "{}x{}".format(w, h), "-r", str(fps), "-i", "-" ]
+                    + list(args) + [fname] )
+        process = subprocess.Popen(command, stdin=subprocess.PIPE)
+        try:
+            self.render(process.stdin)
+        finally:
+            process.stdin.close()
+            process.wait()
+        if process.returncode != 0:
+            raise RuntimeError("ffmpeg failed with code {}".format(process.returncode))
+
+
+################################################################################
+## Frame parallel rendering. Each process keeps one bundle for its frames.
+
+_worker = {}
+
+def _initWorker(animation, save):
+    _worker.update( animation = animation, save = save
+                  , bundle = animation.frameBundle() )
+
+def _renderFrame(i):
+    return _worker["animation"].renderFrame(_worker["bundle"], i, _worker["save"])
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+Batch rendering of Taylor bundles from a job file.
+
+    python batch.py jobs.json --workers 4 --memory 8G --report report.json
+
+A job file is JSON (or TOML, if the `toml` package is installed) with a
+list of jobs, each a dict of `TaylorBundle` options, and optionally
+defaults for all of them:
+
+    { "defaults": { "dpi": 60, "window": [-4, 4, -2.25, 2.25] }
+    , "jobs": [ { "filename": "renders/asteroid"
+                , "curve": {"type": "Trochoid", "args": [-4, 0.3333, 0]}
+                , "tancol": { "type": "mix2"
+                            , "args": ["b", "r", {"type": "cosine", "args": [0, 1.5708]}] }
+                }
+              ]
+    }
+
+Objects are given as {"type": name, "args": [...], "kwargs": {...}}, where
+name is a function or class of `curve` or `colormix`, and any function
+can be referred to as {"function": "numpy.sin"}. Every job needs a
+`filename`.
+
+The jobs run in processes of their own, as many at a time as there are
+workers and their estimated memory fits in the budget. Every start and
+end of a job is appended to a ledger, so that after a crash the batch
+can be run again and only renders the jobs that aren't done. Jobs that
+are done and unchanged since, with their images still there, are
+skipped. The time and peak memory of each job are written to a JSON
+report.
+
+@author rmj86
+"""
+
+import argparse
+import importlib
+import json
+import multiprocessing
+import os
+import Queue
+import sys
+import time
+import traceback
+
+import cache
+import curve
+import colormix
+import taylorbundle
+
+
+################################################################################
+## Job specifications
+
+def loadJobs(fname):
+    """ the list of option dicts of the jobs in the JSON or TOML file
+        fname, with the defaults applied """
+    with open(fname) as f:
+        if fname.endswith(".toml"):
+            import toml     # optional, only for TOML job files
+            spec = toml.load(f)
+        else:
+            spec = json.load(f)
+    if isinstance(spec, list):
+        spec = {"jobs": spec}
+    jobs = []
+    for i, job in enumerate(spec.get("jobs", [])):
+        options = dict(spec.get("defaults", {}))
+        options.update(job)
+        if "filename" not in options:
+            raise ValueError("job {} has no filename".format(i))
+        jobs.append(options)
+    return jobs
+
+def build(value):
+    """ the objects described in an option value """
+    if isinstance(value, unicode):
+        return value.encode("utf-8")
+    if isinstance(value, list):
+        return [build(v) for v in value]
+    if not isinstance(value, dict):
+        return value
+    if "function" in value:
+        module, name = value["function"].rsplit(".", 1)
+        return getattr(importlib.import_module(module), name)
+    if "type" in value:
+        name = value["type"]
+        for module in (curve, colormix):
+            if hasattr(module, name):
+                f = getattr(module, name)
+                break
+        else:
+            raise ValueError('no curve or colour function "{}"'.format(name))
+        kwargs = dict((str(k), build(v)) for k, v in value.get("kwargs", {}).items())
+        return f(*build(value.get("args", [])), **kwargs)
+    return dict((build(k), build(v)) for k, v in value.items())
+
+def makeBundle(options):
+    """ the TaylorBundle of a job's options """
+    return taylorbundle.TaylorBundle(**dict((str(k), build(v)) for k, v in options.items()))
+
+def jobHash(options):
+    """ a fingerprint of a job's options, to tell whether it changed """
+    return cache.fingerprint(json.dumps(options, sort_keys=True))
+
+def parseSize(s):
+    """ bytes of a size like "512M" or "8G" """
+    units = {"K": 2**10, "M": 2**20, "G": 2**30, "T": 2**40}
+    s = str(s).strip().upper().rstrip("B")
+    if s and s[-1] in units:
+        return int(float(s[:-1]) * units[s[-1]])
+    return int(s)
+
+
+################################################################################
+## Ledger
+
+class Ledger(object):
+    """ an append-only log of the jobs' starts and ends, one JSON object
+        per line """
+    def __init__(self, fname):
+        self.fname = fname
+        self.done = {}
+        if os.path.exists(fname):
+            with open(fname) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:  # the end of a crashed write
+                        continue
+                    if entry["status"] == "done":
+                        self.done[entry["filename"]] = entry["hash"]
+                    else:
+                        self.done.pop(entry["filename"], None)
+    def isDone(self, options):
+        """ whether the job was rendered with these options, and its image
+            is still there """
+        name = options["filename"]
+        return ( self.done.get(name) == jobHash(options)
+                 and os.path.exists(name + ".png") )
+    def write(self, options, status, **info):
+        entry = dict(info, filename=options["filename"], hash=jobHash(options),
+                     status=status, time=time.time())
+        with open(self.fname, "a") as f:
+            f.write(json.dumps(entry, sort_keys=True) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        if status == "done":
+            self.done[options["filename"]] = entry["hash"]
+
+
+################################################################################
+## Scheduling
+
+def _runJob(index, options, results):
+    """ render a job, in a process of its own, and post its time and peak
+        memory """
+    import resource
+    t0 = time.time()
+    try:
+        makeBundle(options).render()
+        status, error = "done", None
+    except Exception:
+        status, error = "failed", traceback.format_exc()
+    # ru_maxrss is in kilobytes on linux, in bytes on mac
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss *= 1 if sys.platform == "darwin" else 1024
+    results.put((index, status, error, time.time() - t0, rss))
+
+def runBatch(jobs, workers=1, memory=None, ledger=None, force=False, log=sys.stdout):
+    """ render the jobs, at most `workers` at a time and within `memory`
+        bytes of estimated memory. Returns the report: a list of dicts per
+        job. """
+    report = [ dict(filename=o["filename"], status="pending") for o in jobs ]
+    pending = []
+    for i, options in enumerate(jobs):
+        if not force and ledger is not None and ledger.isDone(options):
+            report[i]["status"] = "skipped"
+            continue
+        try:
+            estimate = makeBundle(options).estimate()["memory"]
+        except Exception:
+            report[i].update(status="failed", error=traceback.format_exc())
+            continue
+        report[i]["estimated_memory"] = estimate
+        pending.append(i)
+    results = multiprocessing.Queue()
+    running = {}    # index: (process, estimate)
+    while pending or running:
+        # start the jobs that fit, in order. A job larger than the budget
+        # runs alone.
+        used = sum(e for p, e in running.values())
+        for i in list(pending):
+            if len(running) >= workers:
+                break
+            estimate = report[i]["estimated_memory"]
+            if memory is not None and running and used + estimate > memory:
+                continue
+            if ledger is not None:
+                ledger.write(jobs[i], "started")
+            process = multiprocessing.Process(target=_runJob, args=(i, jobs[i], results))
+            process.start()
+            running[i] = (process, estimate)
+            used += estimate
+            pending.remove(i)
+            log.write("started {}\n".format(jobs[i]["filename"]))
+        # wait for a job to end
+        try:
+            (i, status, error, seconds, rss) = results.get(timeout=1)
+        except Queue.Empty:
+            # jobs whose processes died without a word, e.g. killed
+            for i, (process, estimate) in running.items():
+                if not process.is_alive() and results.empty():
+                    process.join()
+                    del running[i]
+                    report[i].update( status="failed"
+                                    , error="exit code {}".format(process.exitcode) )
+                    if ledger is not None:
+                        ledger.write(jobs[i], "failed")
+            continue
+        running.pop(i)[0].join()
+        report[i].update(status=status, seconds=seconds, peak_memory=rss)
+        if error is not None:
+            report[i]["error"] = error
+        if ledger is not None:
+            ledger.write(jobs[i], status, seconds=seconds, peak_memory=rss)
+        log.write("{} {} in {:.1f}s\n".format(status, jobs[i]["filename"], seconds))
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render a batch of Taylor bundles.")
+    parser.add_argument("jobfile", help="JSON or TOML file of the jobs")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count(),
+                        help="number of jobs to run at a time")
+    parser.add_argument("--memory", default=None,
+                        help="memory budget of the jobs running at a time, e.g. 8G")
+    parser.add_argument("--ledger", default=None,
+                        help="ledger file (default: <jobfile>.ledger)")
+    parser.add_argument("--report", default=None,
+                        help="report file (default: <jobfile>.report.json)")
+    parser.add_argument("--force", action="store_true",
+                        help="render also the jobs that are up to date")
+    args = parser.parse_args(argv)
+    jobs = loadJobs(args.jobfile)
+    ledger = Ledger(args.ledger or args.jobfile + ".ledger")
+    memory = None if args.memory is None else parseSize(args.memory)
+    report = runBatch(jobs, args.workers, memory, ledger, args.force)
+    with open(args.report or args.jobfile + ".report.json", "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    return 1 if any(r["status"] == "failed" for r in report) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+A content addressed cache of render artifacts on disk.
+
+Artifacts are dicts of numpy arrays, saved as .npz files named by a
+fingerprint of everything they are computed from: the options and the
+curves and colour functions, down to the code of the functions, their
+closures and the globals they use. Changing any of them gives a new
+fingerprint, so entries are never stale, only unused. The least recently
+used entries are deleted once the cache grows beyond its size.
+
+@author rmj86
+"""
+
+import hashlib
+import os
+import sys
+import tempfile
+import types
+import numpy
+
+# functions and classes of these packages are identified by their names
+# only, rather than by their code
+external = {"numpy", "matplotlib", "scipy", "math", "cmath", "__builtin__"}
+
+
+################################################################################
+## Fingerprints
+
+def fingerprint(*objs):
+    """ a hex digest of the values of objs, which is the same for equal
+        values in every run """
+    h = hashlib.sha1()
+    _feed(h, objs, {})
+    return h.hexdigest()
+
+def _isExternal(obj):
+    module = getattr(obj, "__module__", None) or ""
+    return module.split(".")[0] in external
+
+def _feed(h, obj, seen):
+    """ add obj to the hash h. `seen` numbers the objects already added,
+        which are referred to by that number, for cyclic references. """
+    if obj is None or isinstance(obj, (bool, int, long, float, complex, str, unicode)):
+        h.update("{}:{!r};".format(type(obj).__name__, obj))
+        return
+    if isinstance(obj, numpy.generic):
+        obj = numpy.asarray(obj)
+    if isinstance(obj, numpy.ndarray):
+        h.update("array:{}:{};".format(obj.dtype.str, obj.shape))
+        if obj.dtype == object:
+            _feed(h, obj.tolist(), seen)
+        else:
+            h.update(numpy.ascontiguousarray(obj).tobytes())
+        return
+    if id(obj) in seen:
+        h.update("ref:{};".format(seen[id(obj)][0]))
+        return
+    # keep obj alive, so that its id isn't reused
+    seen[id(obj)] = (len(seen), obj)
+    if isinstance(obj, (tuple, list)):
+        h.update("{}:{};".format(type(obj).__name__, len(obj)))
+        for x in obj:
+            _feed(h, x, seen)
+    elif isinstance(obj, dict):
+        h.update("dict:{};".format(len(obj)))
+        for k in sorted(obj, key=repr):
+            _feed(h, k, seen)
+            _feed(h, obj[k], seen)
+    elif isinstance(obj, (set, frozenset)):
+        h.update("set:{};".format(len(obj)))
+        for x in sorted(fingerprint(x) for x in obj):
+            h.update(x)
+    elif isinstance(obj, types.ModuleType):
+        h.update("module:{};".format(obj.__name__))
+    elif isinstance(obj, (types.BuiltinFunctionType, numpy.ufunc)):
+        h.update("builtin:{}.{};".format(getattr(obj, "__module__", ""), obj.__name__))
+    elif isinstance(obj, types.FunctionType):
+        if _isExternal(obj):
+            h.update("function:{}.{};".format(obj.__module__, obj.__name__))
+            return
+        h.update("function;")
+        _feed(h, obj.__code__, seen)
+        _feed(h, obj.__defaults__, seen)
+        _feed(h, [c.cell_contents for c in obj.__closure__ or ()], seen)
+        # the globals it refers to, also those of nested functions
+        names = sorted(_globalNames(obj.__code__))
+        _feed(h, [(n, obj.__globals__[n]) for n in names if n in obj.__globals__], seen)
+    elif isinstance(obj, types.CodeType):
+        h.update("code:{};".format(obj.co_code.encode("hex")))
+        _feed(h, obj.co_consts, seen)
+        _feed(h, obj.co_names, seen)
+    elif isinstance(obj, types.MethodType):
+        h.update("method;")
+        _feed(h, obj.__func__, seen)
+        _feed(h, obj.__self__, seen)
+    elif isinstance(obj, (staticmethod, classmethod)):
+        h.update("{};".format(type(obj).__name__))
+        _feed(h, obj.__func__, seen)
+    elif isinstance(obj, (type, types.ClassType)):
+        h.update("class:{}.{};".format(obj.__module__, obj.__name__))
+        if not _isExternal(obj):
+            for cls in getattr(obj, "__mro__", (obj,)):
+                if cls is not object:
+                    _feed(h, [ (k, v) for k, v in sorted(vars(cls).items())
+                               if isinstance(v, (types.FunctionType, staticmethod, classmethod, property)) ], seen)
+    elif isinstance(obj, property):
+        h.update("property;")
+        _feed(h, [obj.fget, obj.fset], seen)
+    else:
+        # other objects by their class and public attributes. Attributes
+        # starting with an underscore are taken to be caches.
+        h.update("object;")
+        _feed(h, type(obj), seen)
+        attrs = getattr(obj, "__dict__", {})
+        _feed(h, dict((k, v) for k, v in attrs.items() if not k.startswith("_")), seen)
+
+def _globalNames(code):
+    """ the names used in code and the code nested in it """
+    names = set(code.co_names)
+    for c in code.co_consts:
+        if isinstance(c, types.CodeType):
+            names |= _globalNames(c)
+    return names
+
+
+################################################################################
+## The cache
+
+class Cache(object):
+    """ Artifacts in the directory `directory`, of at most `size` bytes
+        in all. """
+    def __init__(self, directory, size=1<<30):
+        self.directory = directory
+        self.size = size
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+    def path(self, key):
+        return os.path.join(self.directory, key + ".npz")
+    def get(self, key):
+        """ the arrays stored under key, or None """
+        path = self.path(key)
+        try:
+            with numpy.load(path) as npz:
+                arrays = dict((k, npz[k]) for k in npz.files)
+            # the modification time marks the last use
+            os.utime(path, None)
+        except (IOError, OSError, ValueError):
+            return None
+        return arrays
+    def put(self, key, arrays):
+        """ store the dict of arrays under key """
+        (fd, tmp) = tempfile.mkstemp(".tmp", "", self.directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                numpy.savez(f, **arrays)
+            if sys.platform == "win32" and os.path.exists(self.path(key)):
+                os.remove(self.path(key))
+            os.rename(tmp, self.path(key))
+        except:
+            os.remove(tmp)
+            raise
+        self.evict()
+    def entries(self):
+        """ (last use, size, path) of the entries, the most recent first """
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".npz"):
+                path = os.path.join(self.directory, name)
+                try:
+                    st = os.stat(path)
+                except OSError:     # deleted by another process
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        return sorted(entries, reverse=True)
+    def evict(self):
+        """ delete the least recently used entries beyond the size """
+        total = 0
+        for (mtime, size, path) in self.entries():
+            total += size
+            if total > self.size:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+    def clear(self):
+        for (mtime, size, path) in self.entries():
+            os.remove(path)
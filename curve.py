@@ -4,6 +4,8 @@ import numpy
 from numpy import sin, cos, zeros, ones, newaxis
 from numpy.polynomial import Polynomial
 from math import factorial
+from fractions import Fraction
+import jet
 
 
 ################################################################################
@@ -25,21 +27,180 @@ def pascal(n, memo={0: numpy.array([[1]])}):
     return this
 
 def taylorPoly(f, a, n=1, df=None):
-    """ Degree n Taylor polynomial of f(x) around the point x=a. """
+    """ Degree n Taylor polynomial of f(x) around the point x=a. The
+        coefficients are kept in the local basis (x-a)**k, by mapping the
+        polynomial's domain onto a window shifted by a. This avoids the
+        cancellation of re-expanding around 0 when |a| is large. """
     if df is None:
         df = lambda a, n: numDiff(f, a, n)
-    fprime = zeros(((n+1),(n+1)))
-    for i in range(n+1):
-        value = df(a, i) / factorial(i)
-        for j in range(i+1):
-            x, y = i-j, j
-            fprime[x,y] = value
-    pasc = pascal(n)
-    alpha = (-a)**numpy.arange(n+1)
-    terms = alpha[newaxis,:] * pasc * fprime
-    coeff = numpy.sum(terms, axis=1)
-    return Polynomial(coeff)
+    coeff = [df(a, i) / factorial(i) for i in range(n+1)]
+    return Polynomial(coeff, domain=[a-1, a+1], window=[-1, 1])
 
+def vandermonde(s, n):
+    """ Table of the powers s**0, ..., s**n of the offsets `s`.
+        Shape (len(s), n+1). """
+    return numpy.vander(numpy.asarray(s, dtype=numpy.float64), n+1,
+                        increasing=True)
+
+def taylorVertices(coeffs, vander):
+    """ Evaluate many Taylor curves at the same offsets from their points
+        of tangency, as a single matrix product. `coeffs` are in the local
+        basis, shape (m, n+1, 2), and `vander` is the table of the offsets'
+        powers from `vandermonde`. Returns an array of shape
+        (m, len(offsets), 2). """
+    m, n1 = coeffs.shape[:2]
+    res = vander.shape[0]
+    c = coeffs.transpose(0,2,1).reshape(2*m, n1)
+    vertices = numpy.dot(c, vander.T)
+    return vertices.reshape(m, 2, res).transpose(0,2,1)
+
+def taylorVertexSweep(coeffs, vander, degrees):
+    """ The vertices of `taylorVertices` for the Taylor curves truncated
+        at each of the increasing `degrees`, one after another. Each
+        degree's vertices are those of the degree before plus its terms
+        c_k*s**k. `vander` must have the powers up to the last degree. """
+    m = coeffs.shape[0]
+    res = vander.shape[0]
+    vertices = numpy.zeros((m, res, 2), dtype=numpy.result_type(coeffs, vander))
+    k = 0
+    for n in degrees:
+        for k in range(k, n+1):
+            vertices += coeffs[:,newaxis,k] * vander[newaxis,:,k,newaxis]
+        k = n+1
+        yield vertices.copy()
+
+def taylorSegments(coeffs, smin, smax, tolerance, maxsegments=None):
+    """ Number of polyline segments for each Taylor curve on the offsets
+        smin..smax (numbers, or arrays of one per curve), so that the
+        polyline is within `tolerance` of the curve. A chord of length h
+        in s is within h**2/8 * max|p''| of the curve, and |p''| is
+        bounded by the coefficients. Lines get one segment. """
+    n1 = coeffs.shape[1]
+    r = numpy.maximum(abs(numpy.asarray(smin)), abs(numpy.asarray(smax)))
+    k = numpy.arange(2, n1)
+    norms = numpy.sqrt((coeffs[:,2:]**2).sum(axis=-1))
+    powers = numpy.asarray(r, dtype=numpy.float64)[...,newaxis]**(k-2)
+    bound = (norms * k*(k-1) * powers).sum(axis=-1)
+    h = numpy.sqrt(8 * tolerance / numpy.maximum(bound, 1e-300))
+    segments = numpy.ceil((smax-smin) / h).clip(1, maxsegments)
+    return segments.astype(int)
+
+def taylorPolylines(coeffs, smin, smax, segments, first=None, count=None):
+    """ Vertices of the Taylor curves as polylines of the given numbers of
+        segments on the offsets smin..smax (numbers, or arrays of one per
+        curve). With `first` and `count`, only the `count` segments from
+        segment `first` on are made, with the same vertices. Curves with
+        the same number of vertices are evaluated together. Returns a list
+        of arrays of shape (count[i]+1, 2). """
+    segments = numpy.asarray(segments)
+    smin, smax = [ numpy.broadcast_to(numpy.asarray(v, dtype=numpy.float64), segments.shape)
+                   for v in (smin, smax) ]
+    if first is None:
+        first, count = numpy.zeros_like(segments), segments
+    polylines = [None] * len(coeffs)
+    for c in numpy.unique(count):
+        index = numpy.flatnonzero(count == c)
+        j = first[index,newaxis] + numpy.arange(c+1)
+        lo, hi = smin[index,newaxis], smax[index,newaxis]
+        s = lo + (hi-lo) * (j / segments[index,newaxis].astype(numpy.float64))
+        vertices = hornerVertices(coeffs[index], s)
+        for i, v in zip(index, vertices):
+            polylines[i] = v
+    return polylines
+
+def restrictPieces(coeffs, smin, smax, segments, window):
+    """ The parts of polylines, as made by `taylorPolylines`, which are
+        inside `window`. Returns arrays (piece, first, count): for each
+        part the index of its polyline and its range of segments. The
+        vertices are those of the whole polylines, so that the parts of
+        neighbouring windows join exactly. """
+    (tpiece, tlo, thi) = visibleIntervals(coeffs, smin.min(), smax.max(), window)
+    lo, hi = numpy.maximum(smin[tpiece], tlo), numpy.minimum(smax[tpiece], thi)
+    keep = lo < hi
+    piece, lo, hi = tpiece[keep], lo[keep], hi[keep]
+    n = segments[piece]
+    h = (smax[piece] - smin[piece]) / n
+    first = numpy.floor((lo - smin[piece]) / h).astype(int).clip(0, n-1)
+    last = numpy.ceil((hi - smin[piece]) / h).astype(int)
+    last = numpy.maximum(first+1, numpy.minimum(last, n))
+    return piece, first, last-first
+
+def hornerVertices(coeffs, s):
+    """ Evaluate Taylor curves, each at its own offsets, by Horner's rule.
+        `coeffs` have shape (m, n+1, 2) and `s` shape (m, k). Returns an
+        array of shape (m, k, 2), of the type of the coefficients. """
+    s = s.astype(coeffs.dtype, copy=False)[...,newaxis]
+    vertices = numpy.repeat(coeffs[:,newaxis,-1], s.shape[1], axis=1)
+    for k in range(coeffs.shape[1]-2, -1, -1):
+        vertices *= s
+        vertices += coeffs[:,newaxis,k]
+    return vertices
+
+def taylorBounds(coeffs, smin, smax):
+    """ Bounding boxes of the Taylor curves on the offsets smin..smax, as
+        arrays (lower, upper) of shape (m, 2). Each term c_k*s**k is within
+        |c_k|*r**k of 0, for r = max(|smin|, |smax|). """
+    r = max(abs(smin), abs(smax))
+    k = numpy.arange(1, coeffs.shape[1])
+    spread = numpy.einsum("ikd,k->id", abs(coeffs[:,1:]), float(r)**k)
+    return coeffs[:,0] - spread, coeffs[:,0] + spread
+
+def polyRoots(p):
+    """ Roots of many polynomials, as eigenvalues of their stacked
+        companion matrices. `p` are the coefficients in increasing order,
+        shape (m, n+1). Returns complex roots of shape (m, n), padded with
+        nan for polynomials of lower degree. """
+    m, n1 = p.shape
+    roots = numpy.full((m, n1-1), numpy.nan, dtype=numpy.complex128)
+    # effective degree of each polynomial
+    nonzero = abs(p) > 1e-14 * abs(p).max(axis=1, keepdims=True)
+    degree = n1-1 - numpy.argmax(nonzero[:,::-1], axis=1)
+    degree[~nonzero.any(axis=1)] = 0
+    for d in numpy.unique(degree):
+        if d < 1:
+            continue
+        index = numpy.flatnonzero(degree == d)
+        companion = numpy.zeros((len(index), d, d))
+        companion[:,1:,:-1] = numpy.eye(d-1)
+        companion[:,:,-1] = -p[index,:d] / p[index,d,newaxis]
+        roots[index,:d] = numpy.linalg.eigvals(companion)
+    return roots
+
+def visibleIntervals(coeffs, smin, smax, window):
+    """ The parts of the offsets smin..smax where the Taylor curves are
+        inside `window` (xmin, xmax, ymin, ymax). The curve crosses the
+        window's edge lines only at real roots of the polynomials x(s)-xmin
+        etc., so between the sorted roots it is either inside or outside.
+        Returns arrays (index, lo, hi) of the visible intervals, with
+        `index` the curve of each interval. """
+    m, n1 = coeffs.shape[:2]
+    (xmin, xmax, ymin, ymax) = window
+    p = numpy.concatenate([ coeffs[:,:,[0]] ] * 2 + [ coeffs[:,:,[1]] ] * 2, axis=2)
+    p = p.transpose(0, 2, 1).copy()
+    p[:,:,0] -= (xmin, xmax, ymin, ymax)
+    roots = polyRoots(p.reshape(4*m, n1)).reshape(m, 4*(n1-1))
+    real = (abs(roots.imag) <= 1e-9) & (roots.real > smin) & (roots.real < smax)
+    cuts = numpy.where(real, roots.real, smax)
+    cuts = numpy.concatenate([ numpy.full((m, 1), smin, dtype=numpy.float64)
+                             , numpy.sort(cuts, axis=1)
+                             , numpy.full((m, 1), smax, dtype=numpy.float64) ], axis=1)
+    lo, hi = cuts[:,:-1], cuts[:,1:]
+    # inside or outside at the midpoints
+    mid = (lo + hi) / 2
+    xy = hornerVertices(coeffs, mid)
+    visible = ( (xy[...,0] >= xmin) & (xy[...,0] <= xmax)
+                & (xy[...,1] >= ymin) & (xy[...,1] <= ymax) )
+    # join runs of visible intervals. Empty intervals, at double roots and
+    # the padding, join their neighbours.
+    joined = numpy.zeros((m, lo.shape[1]+2), dtype=bool)
+    joined[:,1:-1] = visible | (hi == lo)
+    starts = joined[:,1:-1] & ~joined[:,:-2]
+    ends = joined[:,1:-1] & ~joined[:,2:]
+    index, j0 = numpy.nonzero(starts)
+    j1 = numpy.nonzero(ends)[1]
+    lo, hi = lo[index,j0], hi[index,j1]
+    keep = hi > lo
+    return index[keep], lo[keep], hi[keep]
 ################################################################################
 ## Calculus helper functions
 
@@ -47,11 +208,59 @@ def numDiff(f, a, n=1, h=0.02):
     """ Numeric nth derivative of function f at point x=a, using symmetric
         finite difference method with point sampling distance h. """
     i = numpy.linspace(-n, n, n+1)
-    x = a + (h/2.0)*i
+    x = numpy.asarray(a)[...,newaxis] + (h/2.0)*i
     y = f(x)
-    difference = numpy.diff(y, n)
+    difference = numpy.diff(y, n, axis=-1)
     derivative = difference / (h**n)
-    return derivative[0]
+    return derivative[...,0][()]
+
+def stencilWeights(m, n, memo={}):
+    """ Finite difference weights for the derivatives of order 0..n on the
+        central stencil of 2m+1 points -m..m, with unit spacing.
+        Shape (n+1, 2m+1). """
+    if (m, n) in memo:
+        return memo[(m, n)]
+    j = numpy.arange(-m, m+1, dtype=numpy.float64)
+    vander = j[newaxis,:] ** numpy.arange(2*m+1)[:,newaxis]
+    weights = numpy.linalg.inv(vander)[:,:n+1].T * factorials(n)[:,newaxis]
+    memo[(m, n)] = weights
+    return weights
+
+def numDerivatives(f, a, n=1, h=0.1, accuracy=4, richardson=True):
+    """ Numeric derivatives of order 0..n of function f at each of the
+        points x=a, using central finite differences.
+
+        The stencil is wide enough that every order has a truncation error
+        of order h**`accuracy` (which should be even). f is evaluated only
+        once, on the stacked stencil points of all the points in `a`, for
+        both of the step sizes h and h/2. The difference between the two
+        step sizes gives an estimate of the error of each order. If
+        `richardson` is True, they are also combined by Richardson
+        extrapolation, cancelling the leading error term.
+
+        Returns the derivatives and their error estimates, both arrays of
+        shape a.shape+(n+1,). """
+    a = numpy.asarray(a, dtype=numpy.float64)
+    m = max(1, (n+accuracy-1)//2)
+    weights = stencilWeights(m, n)
+    j = numpy.arange(-m, m+1)
+    x = a[...,newaxis] + numpy.concatenate([h*j, (h/2.0)*j])
+    y = numpy.ndarray(x.size)
+    y[:] = f(x.ravel())
+    y = y.reshape(x.shape)
+    k = numpy.arange(n+1)
+    d1 = numpy.dot(y[...,:2*m+1], weights.T) / h**k
+    d2 = numpy.dot(y[...,2*m+1:], weights.T) / (h/2.0)**k
+    # order of the truncation error of each derivative on this stencil
+    order = 2*((2*m+2-k)//2)
+    error = abs(d2-d1) / (2.0**order - 1)
+    if richardson:
+        d2 = d2 + (d2-d1) / (2.0**order - 1)
+    return d2, error
+
+def factorials(n):
+    """ array of the factorials 0!, 1!, ..., n! """
+    return numpy.array([factorial(i) for i in range(n+1)], dtype=numpy.float64)
 
 sinprime_memo = [sin, cos, lambda x: -sin(x), lambda x: -cos(x)]
 def sinprime(n):
@@ -63,9 +272,22 @@ def cosprime(n):
     """ nth derivative of cos(x). """
     return cosprime_memo[n%4]
 
+def sinprimes(x, n):
+    """ derivatives of order 0..n of sin(x), stacked along a new last axis. """
+    s, c = sin(x), cos(x)
+    table = numpy.stack([s, c, -s, -c], axis=-1)
+    return table[..., numpy.arange(n+1) % 4]
+
 ################################################################################
 ## Other helper fnctions
 
+tau = 2 * numpy.pi
+
+def _gcd(a, b):
+    while b:
+        a, b = b, a % b
+    return abs(a)
+
 def aconst(x, dtype=numpy.float64):
     """ returns an array function, constant in the value `x`. """
     def _constf(t):
@@ -75,33 +297,267 @@ def aconst(x, dtype=numpy.float64):
 ################################################################################
 ## Curve base class
 
-class Curve:
+class Curve(object):
     """ Parametric 2D curve. """
+    # differentiate x and y on jets when dx or dy is not given
+    autodiff = True
+    # keyword arguments to numDerivatives, for when dx or dy is not given,
+    # and autodiff is off or fails
+    diffoptions = {}
     def __init__(self, x, y, dx=None, dy=None):
         self.x = x
         self.y = y
+        self.exact = (dx is not None, dy is not None)
         if dx is None:
-            def dx(a, n=1): return numDiff(self.x, a, n)
+            def dx(a, n=1): return self._autoDerivatives(self.x, a, n)[...,n][()]
         if dy is None:
-            def dy(a, n=1): return numDiff(self.y, a, n)
+            def dy(a, n=1): return self._autoDerivatives(self.y, a, n)[...,n][()]
         self.dx = dx
         self.dy = dy
+    def _autoDerivatives(self, f, a, n):
+        """ derivatives of order 0..n of a component function f without
+            exact derivatives. Exact by Taylor mode automatic
+            differentiation if f can run on jets, numeric otherwise. """
+        a = numpy.asarray(a, dtype=float)
+        if n == 0:
+            d = numpy.ndarray(a.shape+(1,))
+            d[...,0] = f(a)
+            return d
+        if self.autodiff:
+            try:
+                return jet.taylorCoefficients(f, a, n) * factorials(n)
+            except Exception:
+                pass
+        return numDerivatives(f, a, n, **self.diffoptions)[0]
     def taylorCurve(self, a, n=1):
         """ Taylor curve about the point t=a. """
-        px = taylorPoly(self.x, a, n, df=self.dx)
-        py = taylorPoly(self.y, a, n, df=self.dy)
+        ds = self.derivatives(a, n)
+        px = taylorPoly(self.x, a, n, df=lambda a, i: ds[i,0])
+        py = taylorPoly(self.y, a, n, df=lambda a, i: ds[i,1])
         return Curve(px, py)
+    def derivatives(self, a, n=1):
+        """ Derivatives of order 0..n about each of the points t=a.
+            Returns an array of shape a.shape+(n+1, 2). Components without
+            exact derivatives are differentiated automatically or
+            numerically, with all orders from one evaluation of the
+            component function. """
+        a = numpy.asarray(a, dtype=numpy.float64)
+        ds = numpy.ndarray(a.shape+(n+1, 2))
+        for j, (f, df) in enumerate([(self.x, self.dx), (self.y, self.dy)]):
+            if self.exact[j]:
+                for i in range(n+1):
+                    ds[...,i,j] = df(a, i)
+            else:
+                ds[...,j] = self._autoDerivatives(f, a, n)
+        return ds
+    def taylorCoefficients(self, a, n=1):
+        """ Coefficients of the Taylor curves about each of the points t=a,
+            in the local basis (t-a)**k. Returns an array of shape
+            a.shape+(n+1, 2). """
+        return self.derivatives(a, n) / factorials(n)[:,newaxis]
+    def gridDerivatives(self, tmin, tmax, m, n=1):
+        """ `derivatives` about the m points of the uniform grid
+            linspace(tmin, tmax, m, endpoint=False). Curves may make use of
+            the regular spacing. """
+        return self.derivatives(numpy.linspace(tmin, tmax, m, False), n)
+    def gridTaylorCoefficients(self, tmin, tmax, m, n=1):
+        """ `taylorCoefficients` about the points of a uniform grid, as in
+            `gridDerivatives`. """
+        return self.gridDerivatives(tmin, tmax, m, n) / factorials(n)[:,newaxis]
     def __call__(self, t):
         ps = numpy.ndarray(t.shape+(2,))
         ps[:,0] = self.x(t)
         ps[:,1] = self.y(t)
         return ps
+    # curve arithmetic. numpy should defer to the reflected operators.
+    __array_ufunc__ = None
     def __add__(self, other):
-        def sum_x(t): return self.x(t) + other.x(t)
-        def sum_y(t): return self.y(t) + other.y(t)
-        def sum_dx(a, n=1): return self.dx(a, n) + other.dx(a, n)
-        def sum_dy(a, n=1): return self.dy(a, n) + other.dy(a, n)
-        return Curve(sum_x, sum_y, sum_dx, sum_dy)
+        if isinstance(other, Curve):
+            return Composite([(1, self), (1, other)]).simplified()
+        return self.translate(*other)
+    def __radd__(self, other):
+        if numpy.isscalar(other) and other == 0:   # allows sum(curves)
+            return self
+        return self + other
+    def __sub__(self, other):
+        if isinstance(other, Curve):
+            return Composite([(1, self), (-1, other)]).simplified()
+        return self.translate(*(-numpy.asarray(other)))
+    def __rsub__(self, other):
+        return (-self) + other
+    def __neg__(self):
+        return self.scale(-1)
+    def __mul__(self, k):
+        if not numpy.isscalar(k):
+            return NotImplemented
+        return self.scale(k)
+    __rmul__ = __mul__
+    def __truediv__(self, k):
+        if not numpy.isscalar(k):
+            return NotImplemented
+        return self.scale(1.0/k)
+    __div__ = __truediv__
+    def scale(self, sx, sy=None):
+        """ The curve scaled about the origin by a factor `sx`, or by
+            `sx` and `sy` in the x and y directions. """
+        if sy is None:
+            sy = sx
+        return self.affine((sx, sy))
+    def rotate(self, angle, center=(0, 0)):
+        """ The curve rotated by `angle` radians about `center`. """
+        m = rotation(angle)
+        center = numpy.asarray(center, dtype=numpy.float64)
+        return self.affine(m, center - m.dot(center))
+    def translate(self, dx, dy):
+        """ The curve translated by <dx, dy>. """
+        return self.affine(1, (dx, dy))
+    def affine(self, m, b=(0, 0)):
+        """ The curve  m*c(t) + b  for a 2x2 matrix `m` (or a scale
+            factor, or a pair of x and y scale factors), and a
+            translation `b`. """
+        return Composite([(m, self)], b)
+
+################################################################################
+## Curve algebra
+
+def rotation(angle):
+    """ 2x2 matrix of the rotation by `angle` radians. """
+    c, s = cos(angle), sin(angle)
+    return numpy.array([[c, -s], [s, c]])
+
+def quarterTurns(n):
+    """ matrices of the rotations by 0..n quarter turns. Shape (n+1,2,2). """
+    turns = numpy.array([ [[1,0],[0,1]], [[0,-1],[1,0]]
+                        , [[-1,0],[0,-1]], [[0,1],[-1,0]] ], dtype=numpy.float64)
+    return turns[numpy.arange(n+1) % 4]
+
+def _matrix(m):
+    """ 2x2 matrix from a scale factor, a pair of scale factors, or a 2x2
+        matrix. """
+    m = numpy.asarray(m, dtype=numpy.float64)
+    if m.ndim == 0:
+        return m * numpy.eye(2)
+    if m.shape == (2,):
+        return numpy.diag(m)
+    return m
+
+class Composite(Curve):
+    """ Affine combination of curves,  sum_i M_i*c_i(t) + b,  where the M_i
+        are 2x2 matrices and b is a translation. Curve arithmetic and
+        transformations build composites.
+
+        A composite is kept flat: composite terms are expanded into their
+        own terms, and repeated curves are merged, so however deeply it was
+        built a composite is one sum of primitive curves. The sum is
+        compiled when the composite is made. Points and lines are folded
+        into a single linear function of t, all circles are evaluated
+        together with one set of array operations, and the remaining terms
+        are evaluated once each. Derivatives of all orders are exact when
+        the terms' are. Sums of Fourier curves and points are collapsed
+        into a single FourierCurve (see `simplified`). """
+    def __init__(self, terms, offset=(0, 0)):
+        self.terms, self.offset = self._flatten(terms, offset)
+        self._compile()
+        def x(t): return self.derivatives(t, 0)[...,0,0]
+        def y(t): return self.derivatives(t, 0)[...,0,1]
+        def dx(a, n=1): return self.derivatives(a, n)[...,n,0]
+        def dy(a, n=1): return self.derivatives(a, n)[...,n,1]
+        Curve.__init__(self, x, y, dx, dy)
+    @staticmethod
+    def _flatten(terms, offset):
+        b = numpy.array(offset, dtype=numpy.float64)
+        flat = []
+        for m, c in terms:
+            m = _matrix(m)
+            if isinstance(c, Composite):
+                b = b + m.dot(c.offset)
+                flat.extend((m.dot(mi), ci) for mi, ci in c.terms)
+            else:
+                flat.append((m, c))
+        merged = []
+        for m, c in flat:
+            for i, (mi, ci) in enumerate(merged):
+                if ci is c:
+                    merged[i] = (mi+m, ci)
+                    break
+            else:
+                merged.append((m, c))
+        return merged, b
+    def _compile(self):
+        self._constant = self.offset.copy()
+        self._velocity = zeros(2)
+        fourier = []
+        self._others = []
+        for m, c in self.terms:
+            if type(c) is Point:
+                self._constant += m.dot((c.x0, c.y0))
+            elif type(c) is Line:
+                self._velocity += m.dot((c.a, c.b))
+            elif isinstance(c, FourierCurve):
+                fourier.append((m, c))
+            else:
+                self._others.append((m, c))
+        if fourier:
+            # all Fourier terms are summed by one matrix product. Each
+            # keeps its transform matrix, which is exact also for
+            # reflections and scalings.
+            a, f, p, m = [ numpy.concatenate(v) for v in zip(*
+                [ (c.amplitudes, c.freqs, c.phases, c.termMatrices(m))
+                  for m, c in fourier ]) ]
+            self._fourier = FourierCurve(a, f, p)
+            self._fourier.matrices = m
+        else:
+            self._fourier = None
+        self._merged = None
+    def simplified(self):
+        """ The composite as one FourierCurve when all its terms are
+            Fourier curves or points, with the transforms folded into the
+            terms, terms of equal frequency combined, and the constant as
+            a term of frequency 0. Otherwise the composite itself. """
+        if self._others or any(type(c) is Line for m, c in self.terms):
+            return self
+        terms = []
+        if self._fourier is not None:
+            four = self._fourier.transformed()
+            terms.append((four.amplitudes, four.freqs, four.phases))
+        z0 = complex(*self._constant)
+        if z0 != 0:
+            terms.append(([abs(z0)], [0.0], [numpy.angle(z0)]))
+        if not terms:
+            return FourierCurve([], [], [])
+        a, f, p = [numpy.concatenate(v) for v in zip(*terms)]
+        return FourierCurve(a, f, p).collapsed()
+    def _linear(self, a, n):
+        ds = zeros(a.shape+(n+1, 2))
+        ds[...,0,:] = self._constant + a[...,newaxis]*self._velocity
+        if n >= 1:
+            ds[...,1,:] = self._velocity
+        return ds
+    def _addOthers(self, ds, a, n):
+        for m, c in self._others:
+            d = c.derivatives(a, n).reshape(-1, 2)
+            ds += numpy.dot(d, m.T).reshape(ds.shape)
+        return ds
+    def derivatives(self, a, n=1):
+        a = numpy.asarray(a, dtype=numpy.float64)
+        ds = self._linear(a, n)
+        if self._fourier is not None:
+            ds += self._fourier.derivatives(a, n)
+        return self._addOthers(ds, a, n)
+    def gridDerivatives(self, tmin, tmax, m, n=1):
+        a = numpy.linspace(tmin, tmax, m, False)
+        ds = self._linear(a, n)
+        if self._fourier is not None:
+            if self._fourier.fftGrid(tmin, tmax, m):
+                # the FFT needs the transforms folded into the coefficients
+                if self._merged is None:
+                    self._merged = self._fourier.transformed().collapsed()
+                ds += self._merged.gridDerivatives(tmin, tmax, m, n)
+            else:
+                ds += self._fourier.derivatives(a, n)
+        return self._addOthers(ds, a, n)
+    def __call__(self, t):
+        return self.derivatives(t, 0)[...,0,:]
 
 def fromFunction(f):
     """takes a function  f  and returns a Curve object representing
@@ -110,6 +566,84 @@ def fromFunction(f):
     c = Curve(x, f)
     return c
 
+################################################################################
+## Arc length
+
+class ArcLengthCurve(Curve):
+    """ The curve `curve` reparametrized by arc length over `domain`: the
+        parameter u runs over the same domain, with the arc length from
+        the start proportional to u-domain[0]. Outside of the domain the
+        curve is taken to be periodic with the domain's length. """
+    # Gauss-Legendre nodes and weights on [0, 1], for integrating the speed
+    # over the table's intervals
+    _nodes, _weights = numpy.polynomial.legendre.leggauss(4)
+    _nodes, _weights = (_nodes+1)/2, _weights/2
+    def __init__(self, curve, domain=(0, tau), res=4096, newton=1):
+        self.curve = curve
+        self.domain = tuple(float(v) for v in domain)
+        self.newton = newton
+        tmin, tmax = self.domain
+        # table of the cumulative arc length at the parameter values t
+        self.t = numpy.linspace(tmin, tmax, res+1)
+        self.s = numpy.zeros(res+1)
+        numpy.cumsum(self._length(self.t[:-1], self.t[1:]), out=self.s[1:])
+        self.length = self.s[-1]
+        # speed w.r.t. u
+        self.speed = self.length / (tmax-tmin)
+        def x(u): return self.curve.x(self.parameterAt(u))
+        def y(u): return self.curve.y(self.parameterAt(u))
+        def dx(a, n=1): return self.derivatives(a, n)[...,n,0][()]
+        def dy(a, n=1): return self.derivatives(a, n)[...,n,1][()]
+        Curve.__init__(self, x, y, dx, dy)
+    def _speed(self, t):
+        d = self.curve.derivatives(t, 1)[...,1,:]
+        return numpy.sqrt((d*d).sum(axis=-1))
+    def _length(self, t0, t1):
+        """ arc length between the parameter values t0 and t1. """
+        t0, t1 = numpy.asarray(t0)[...,newaxis], numpy.asarray(t1)[...,newaxis]
+        v = self._speed(t0 + (t1-t0)*self._nodes)
+        return numpy.dot(v, self._weights) * (t1-t0)[...,0]
+    def parameterAt(self, u):
+        """ The parameter values of the original curve at the arc length
+            parameters `u`, by lookup in the table of arc lengths and a few
+            Newton steps. """
+        u = numpy.asarray(u, dtype=numpy.float64)
+        tmin, tmax = self.domain
+        turns, u = numpy.divmod(u - tmin, tmax - tmin)
+        s = u * self.speed
+        i = numpy.searchsorted(self.s, s, side="right").clip(1, len(self.s)-1) - 1
+        s0, s1 = self.s[i], self.s[i+1]
+        t0, t1 = self.t[i], self.t[i+1]
+        ds = numpy.where(s1 > s0, s1-s0, 1)
+        t = t0 + (t1-t0) * (s-s0) / ds
+        for k in range(self.newton):
+            speed = self._speed(t)
+            t = t - (s0 + self._length(t0, t) - s) / numpy.where(speed > 0, speed, 1)
+        return t + turns*(tmax-tmin)
+    def taylorCoefficients(self, a, n=1):
+        """ Taylor coefficients of the reparametrized curve. The series
+            sigma(u) of the original parameter solves
+                sigma' = speed / |c'(sigma)|,
+            which fixes one more coefficient for every iteration. """
+        t = self.parameterAt(a)
+        p = numpy.moveaxis(self.curve.taylorCoefficients(t, n), -2, 0)
+        sigma = numpy.zeros((n+1,)+t.shape)
+        sigma[0] = t
+        # derivative of p, padded to n+1 coefficients
+        dp = numpy.zeros(p.shape)
+        dp[:-1] = numpy.arange(1, n+1).reshape((-1,)+(1,)*t.ndim+(1,)) * p[1:]
+        for k in range(n):
+            v = [jet.compose(dp[...,j], sigma) for j in (0, 1)]
+            v2 = jet._add(jet._mul(v[0], v[0]), jet._mul(v[1], v[1]))
+            dsigma = self.speed * jet._power(v2, jet._const(-0.5, v2))
+            sigma = jet._integral(t, dsigma[:-1])
+        c = numpy.stack([jet.compose(p[...,j], sigma) for j in (0, 1)], axis=-1)
+        return numpy.moveaxis(c, 0, -2)
+    def derivatives(self, a, n=1):
+        return self.taylorCoefficients(a, n) * factorials(n)[:,newaxis]
+    def __call__(self, u):
+        return self.curve(self.parameterAt(u))
+
 ################################################################################
 ## Primitive curves
 
@@ -117,6 +651,7 @@ class Point(Curve):
     def __init__(self, x0, y0):
         """ A parametric point, i.e. a parametric curve  <x(t),y(t)>
             such that  x(t) = `x0`, y(t) = `x0`  for all t. """
+        self.x0, self.y0 = x0, y0
         fx = aconst(x0)
         fy = aconst(y0)
         def dx(a, n=1):
@@ -126,11 +661,18 @@ class Point(Curve):
             if n==0: return y0
             else: return 0
         Curve.__init__(self, fx, fy, dx, dy)
+    def derivatives(self, a, n=1):
+        a = numpy.asarray(a, dtype=numpy.float64)
+        ds = zeros(a.shape+(n+1, 2))
+        ds[...,0,0] = self.x0
+        ds[...,0,1] = self.y0
+        return ds
 
 class Line(Curve):
     def __init__(self, a, b):
         """ Parametric line through (0,0) with run and rise a, b.
             <a*t, b*t> """
+        self.a, self.b = a, b
         def x(t): return a*t
         def y(t): return b*t
         def dx(t, n=1):
@@ -142,22 +684,161 @@ class Line(Curve):
             elif n==1: return b
             else:      return 0
         Curve.__init__(self, x, y, dx, dy)
+    def derivatives(self, t, n=1):
+        t = numpy.asarray(t, dtype=numpy.float64)
+        ds = zeros(t.shape+(n+1, 2))
+        ds[...,0,0] = self.a*t
+        ds[...,0,1] = self.b*t
+        if n >= 1:
+            ds[...,1,0] = self.a
+            ds[...,1,1] = self.b
+        return ds
+
+class FourierCurve(Curve):
+    def __init__(self, amplitudes, freqs, phases=0.0):
+        """ A finite trigonometric series. The curve's x and y are the real
+            and imaginary parts of
+                z(t) = sum_j a_j * exp(i*(f_j*t + p_j))
+            for the real `amplitudes` a_j, `freqs` f_j and `phases` p_j.
+            Derivatives of all orders are exact. """
+        a, f, p = numpy.broadcast_arrays(
+            *[numpy.array(v, dtype=numpy.float64, ndmin=1)
+              for v in (amplitudes, freqs, phases)] )
+        self.amplitudes, self.freqs, self.phases = a.copy(), f.copy(), p.copy()
+        # optional 2x2 transform of each term, see Composite
+        self.matrices = None
+        def x(t): return self.derivatives(t, 0)[...,0,0]
+        def y(t): return self.derivatives(t, 0)[...,0,1]
+        def dx(a, n=1): return self.derivatives(a, n)[...,n,0][()]
+        def dy(a, n=1): return self.derivatives(a, n)[...,n,1][()]
+        Curve.__init__(self, x, y, dx, dy)
+    @classmethod
+    def fromCoefficients(cls, coeffs, freqs):
+        """ FourierCurve  z(t) = sum_j c_j * exp(i*f_j*t)  with complex
+            coefficients `coeffs` c_j. """
+        coeffs = numpy.asarray(coeffs, dtype=numpy.complex128)
+        return cls(abs(coeffs), freqs, numpy.angle(coeffs))
+    @property
+    def coefficients(self):
+        """ complex coefficients c_j of  z(t) = sum_j c_j * exp(i*f_j*t) """
+        return self.amplitudes * numpy.exp(1j*self.phases)
+    @property
+    def period(self):
+        """ The smallest common period of the terms, or None when the
+            frequencies are incommensurate (or all 0). """
+        f = abs(self.freqs[(self.freqs != 0) & (self.amplitudes != 0)])
+        if len(f) == 0:
+            return None
+        ratios = [Fraction(r).limit_denominator(1000) for r in f/f[0]]
+        if max(abs(float(q)-r) for q, r in zip(ratios, f/f[0])) > 1e-9:
+            return None
+        denom = 1
+        for q in ratios:
+            denom = denom*q.denominator // _gcd(denom, q.denominator)
+        numer = 0
+        for q in ratios:
+            numer = _gcd(numer, q.numerator*denom // q.denominator)
+        return tau * denom / (f[0] * numer)
+    def transformed(self, m=1):
+        """ The FourierCurve  m*z(t)  for a 2x2 matrix `m`, with the terms'
+            own `matrices` folded in. A linear map of the plane is
+            z -> alpha*z + beta*conj(z),  so every term of a general
+            transform splits in two, of frequencies f_j and -f_j. """
+        ms = self.termMatrices(m)
+        (p, q), (r, s) = ms[:,0].T, ms[:,1].T
+        alpha = ((p+s) + 1j*(r-q)) / 2
+        beta = ((p-s) + 1j*(r+q)) / 2
+        terms = []
+        for coeff, freqs, phases in [ (alpha, self.freqs, self.phases)
+                                    , (beta, -self.freqs, -self.phases) ]:
+            # real coefficients keep their sign, so that pure scalings
+            # stay exact
+            real = coeff.imag == 0
+            amp = numpy.where(real, coeff.real, abs(coeff)) * self.amplitudes
+            phases = phases + numpy.where(real, 0, numpy.angle(coeff))
+            keep = amp != 0
+            terms.append((amp[keep], freqs[keep], phases[keep]))
+        a, f, p = [numpy.concatenate(v) for v in zip(*terms)]
+        return FourierCurve(a, f, p)
+    def termMatrices(self, m=1):
+        """ the transform matrix m*matrices[j] of each term, stacked. """
+        m = _matrix(m)
+        if self.matrices is None:
+            return numpy.broadcast_to(m, (len(self.freqs), 2, 2))
+        return numpy.einsum("ij,kjl->kil", m, self.matrices)
+    def collapsed(self):
+        """ The same curve with the terms of equal frequency combined. """
+        freqs, index, counts = numpy.unique(
+            self.freqs, return_inverse=True, return_counts=True )
+        if len(freqs) == len(self.freqs):
+            return self
+        coeffs = numpy.zeros(len(freqs), dtype=numpy.complex128)
+        numpy.add.at(coeffs, index, self.coefficients)
+        a, p = abs(coeffs), numpy.angle(coeffs)
+        # single terms are kept as they were
+        single = (counts == 1)[index]
+        a[index[single]] = self.amplitudes[single]
+        p[index[single]] = self.phases[single]
+        return FourierCurve(a, freqs, p)
+    def derivatives(self, a, n=1):
+        # The derivative of order k of a term is the term scaled by f**k
+        # and rotated by k quarter turns. So all orders of all terms are
+        # one matrix product of the terms' cos and sin values with a table
+        # of the scaled and rotated unit vectors.
+        a = numpy.asarray(a, dtype=numpy.float64)
+        theta = a[...,newaxis]*self.freqs + self.phases
+        cs = numpy.stack([cos(theta), sin(theta)], axis=-1)
+        cs = cs.reshape(a.shape+(2*len(self.freqs),))
+        return numpy.dot(cs, self._table(n)).reshape(a.shape+(n+1, 2))
+    def _table(self, n):
+        w = self.amplitudes[:,newaxis] * self.freqs[:,newaxis]**numpy.arange(n+1)
+        if self.matrices is None:
+            table = numpy.einsum("jk,kml->jlkm", w, quarterTurns(n))
+        else:
+            table = numpy.einsum( "jk,jim,kml->jlki"
+                                , w, self.matrices, quarterTurns(n) )
+        return table.reshape(2*len(self.freqs), 2*(n+1))
+    # least number of terms for which gridDerivatives uses the FFT
+    fftterms = 16
+    def fftGrid(self, tmin, tmax, m):
+        """ True when gridDerivatives uses the FFT, which needs every term
+            to make a whole number of turns over the grid. """
+        k = self.freqs * (tmax-tmin) / tau
+        return ( m > 0 and len(self.freqs) >= self.fftterms
+                 and abs(k - numpy.round(k)).max() <= 1e-9 )
+    def gridDerivatives(self, tmin, tmax, m, n=1):
+        """ When every term makes a whole number of turns over the grid,
+            all the points are evaluated with one inverse FFT per order. """
+        if not self.fftGrid(tmin, tmax, m):
+            return Curve.gridDerivatives(self, tmin, tmax, m, n)
+        if self.matrices is not None:
+            return self.transformed().gridDerivatives(tmin, tmax, m, n)
+        k = numpy.round(self.freqs * (tmax-tmin) / tau).astype(int) % m
+        orders = numpy.arange(n+1)[:,newaxis]
+        ipow = numpy.array([1, 1j, -1, -1j])[orders % 4]
+        c = self.amplitudes * numpy.exp(1j*(self.freqs*tmin + self.phases))
+        spectrum = numpy.zeros((n+1, m), dtype=numpy.complex128)
+        numpy.add.at(spectrum, (slice(None), k), ipow * self.freqs**orders * c)
+        z = numpy.fft.ifft(spectrum, axis=1) * m
+        ds = numpy.ndarray((m, n+1, 2))
+        ds[...,0] = z.real.T
+        ds[...,1] = z.imag.T
+        return ds
+    def __call__(self, t):
+        return self.derivatives(t, 0)[...,0,:]
 
-class Circle(Curve):
+class Circle(FourierCurve):
     def __init__(self, r, omega=1.0, o=0.0):
         """ Parametric circle with radius `r`, angular
             velocity `omega`, and rotational offset `o`.
             <r*cos(omega*t+o), r*sin(omega*t+o)> """
-        def x(t): return r*cos(omega*t+o)
-        def y(t): return r*sin(omega*t+o)
-        def dx(a, n=1): return omega**n * r*cosprime(n)(omega*a+o)
-        def dy(a, n=1): return omega**n * r*sinprime(n)(omega*a+o)
-        Curve.__init__(self, x, y, dx, dy)
+        self.r, self.omega, self.o = r, omega, o
+        FourierCurve.__init__(self, r, omega, o)
 
 ################################################################################
 ## Special curves
 
-class Epitrochoid(Curve):
+class Epitrochoid(FourierCurve):
     def __init__(self, R, r, d, o=0.0):
         """ An epitrochoid is a roulette traced by a point attached to a
             circle of radius `r` rolling around the outside of a fixed
@@ -165,19 +846,14 @@ class Epitrochoid(Curve):
             from the center of the exterior circle. `o` is the
             rotational offset of the rotating circle (0<=o<tau).
             https://en.wikipedia.org/wiki/Epitrochoid """
+        self.R, self.r, self.d, self.o = R, r, d, o
         r1 = R+r
         omega = float(R+r) / r
-        def x(t): return r1*cos(t) - d*cos(omega*t+o)
-        def y(t): return r1*sin(t) - d*sin(omega*t+o)
-        def dx(t, n=1):
-            cp = cosprime(n)
-            return r1*cp(t) - d*omega**n*cp(omega*t+o)
-        def dy(t, n=1):
-            sp = sinprime(n)
-            return r1*sp(t) - d*omega**n*sp(omega*t+o)
-        Curve.__init__(self, x, y, dx, dy)
+        self.r1, self.omega = r1, omega
+        # <r1*cos(t) - d*cos(omega*t+o), r1*sin(t) - d*sin(omega*t+o)>
+        FourierCurve.__init__(self, [r1, -d], [1, omega], [0, o])
 
-class Hypotrochoid(Curve):
+class Hypotrochoid(FourierCurve):
     def __init__(self, R, r, d, o=0.0):
         """ A hypotrochoid is a roulette traced by a point attached to a
             circle of radius `r` rolling around the inside of a fixed
@@ -185,17 +861,12 @@ class Hypotrochoid(Curve):
             from the center of the interior circle. `o` is the
             rotational offset of the rotating circle (0<=o<tau).
             https://en.wikipedia.org/wiki/Hypotrochoid """
+        self.R, self.r, self.d, self.o = R, r, d, o
         r1 = R-r
         omega = float(R-r) / r
-        def x(t): return r1*cos(t) + d*cos(omega*t+o)
-        def y(t): return r1*sin(t) - d*sin(omega*t+o)
-        def dx(t, n=1):
-            cp = cosprime(n)
-            return r1*cp(t) + d*omega**n*cp(omega*t+o)
-        def dy(t, n=1):
-            sp = sinprime(n)
-            return r1*sp(t) - d*omega**n*sp(omega*t+o)
-        Curve.__init__(self, x, y, dx, dy)
+        self.r1, self.omega = r1, omega
+        # <r1*cos(t) + d*cos(omega*t+o), r1*sin(t) - d*sin(omega*t+o)>
+        FourierCurve.__init__(self, [r1, d], [1, -omega], [0, -o])
 
 def Trochoid(n, r, o=0.0):
     """ Trochoid curve, simplified.
@@ -207,17 +878,25 @@ def Trochoid(n, r, o=0.0):
     c1 = Circle(r, n+1, o)
     return (c0+c1)
 
-class Lissajous(Curve):
+class Lissajous(FourierCurve):
     def __init__(self, a, b, A, B, delta):
         """ x = A * sin(a + delta)
             y = B * sin(b)
             https://en.wikipedia.org/wiki/Lissajous_curve """
-        def x(t):
-            return A * sin(a*t + delta)
-        def y(t):
-            return B * sin(b*t)
-        def dx(t, n=1):
-            return A * a**n * sinprime(n)(a*t + delta)
-        def dy(t, n=1):
-            return B * b**n * sinprime(n)(b*t)
-        Curve.__init__(self, x, y, dx, dy)
+        self.a, self.b, self.A, self.B, self.delta = a, b, A, B, delta
+        # A*sin(u) = A/2 * (exp(i*(u-tau/4)) + exp(-i*(u-tau/4)))
+        # i*B*sin(v) = B/2 * (exp(i*v) - exp(-i*v))
+        FourierCurve.__init__( self
+                             , [A/2.0, A/2.0, B/2.0, -B/2.0]
+                             , [a, -a, b, -b]
+                             , [delta-tau/4, tau/4-delta, 0, 0] )
+    def derivatives(self, t, n=1):
+        # the sines directly, which is more exact than the sum of the
+        # exponentials
+        t = numpy.asarray(t, dtype=numpy.float64)
+        a, b = self.a, self.b
+        k = numpy.arange(n+1)
+        ds = numpy.ndarray(t.shape+(n+1, 2))
+        ds[...,0] = self.A * a**k * sinprimes(a*t + self.delta, n)
+        ds[...,1] = self.B * b**k * sinprimes(b*t, n)
+        return ds
@@ -1,6 +1,6 @@
 # Example of taylor bundle rendering. "Asteriod curve" as generating curve,
-# with it's 5th degree TB. First it is user-defined and rendered using the
-# default, numeric differentiation. Then it's rendered with the predefined
+# with it's 5th degree TB. First it is user-defined and rendered using
+# numeric differentiation. Then it's rendered with the predefined
 # Trochoid class, using exact differentiation. In this case, it is evident
 # that numerical differnetiation makes no appreiable difference on the
 # result.
@@ -17,6 +17,7 @@ tau = 2*pi  # the correct circle constant
 def x(t): return cos(t) + cos(-3*t) / 3.0
 def y(t): return sin(t) + sin(-3*t) / 3.0
 c_num = curve.Curve(x, y)
+c_num.autodiff = False  # user-defined curves are differentiated exactly by default
 
 color1 = (0.2, 0.4, 1)  # clear blue
 color2 = (1, 0, 0.2)    # red
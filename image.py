@@ -1,7 +1,11 @@
 # -*- coding: utf-8 -*-
 
 import matplotlib
+from matplotlib.colors import colorConverter
 import numpy
+import struct
+import zlib
+import raster
 from misc import timed
 
 def composeAverage(fname_out, fnames_in):
@@ -12,6 +16,98 @@ def composeAverage(fname_out, fnames_in):
     arr0 /= len(fnames_in)
     matplotlib.image.imsave(fname_out, arr0)
 
+def contactSheet(images, columns=None, gap=0, facecolor="w"):
+    """ the rgba images, all of one size, side by side in rows of
+        `columns` (about a square by default), `gap` pixels apart on
+        `facecolor` """
+    n = len(images)
+    if columns is None:
+        columns = int(numpy.ceil(numpy.sqrt(n)))
+    rows = (n + columns - 1) // columns
+    (h, w) = images[0].shape[:2]
+    sheet = numpy.empty((rows*(h+gap) - gap, columns*(w+gap) - gap, 4))
+    sheet[...] = colorConverter.to_rgba(facecolor)
+    for i, img in enumerate(images):
+        (r, c) = divmod(i, columns)
+        sheet[r*(h+gap):r*(h+gap)+h, c*(w+gap):c*(w+gap)+w] = img
+    return sheet
+
+class PNGWriter(object):
+    """ Writes an 8 bit rgba PNG file of size (width, height) band by
+        band, so that the whole image never has to be in memory. """
+    def __init__(self, fname, width, height):
+        self.file = open(fname, "wb")
+        self.width, self.height = width, height
+        self.rows = 0
+        self.compressor = zlib.compressobj(6)
+        self.file.write(b"\x89PNG\r\n\x1a\n")
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+    def _chunk(self, kind, data):
+        self.file.write(struct.pack(">I", len(data)))
+        self.file.write(kind)
+        self.file.write(data)
+        crc = zlib.crc32(data, zlib.crc32(kind)) & 0xffffffff
+        self.file.write(struct.pack(">I", crc))
+    def write(self, band):
+        """ append rows, an uint8 array of shape (rows, width, 4) """
+        band = numpy.ascontiguousarray(band, dtype=numpy.uint8)
+        assert band.shape[1:] == (self.width, 4)
+        # every row starts with its filter type, 0 (none)
+        rows = numpy.zeros((len(band), 1 + 4*self.width), dtype=numpy.uint8)
+        rows[:,1:] = band.reshape(len(band), -1)
+        data = self.compressor.compress(rows.tobytes())
+        if data:
+            self._chunk(b"IDAT", data)
+        self.rows += len(band)
+    def close(self):
+        if self.rows != self.height:
+            raise ValueError("wrote {} of {} rows".format(self.rows, self.height))
+        self._chunk(b"IDAT", self.compressor.flush())
+        self._chunk(b"IEND", b"")
+        self.file.close()
+
+def toBytes(img):
+    """ rgba floats in [0, 1] to uint8, the way matplotlib saves them """
+    return (numpy.clip(img, 0, 1) * 255).astype(numpy.uint8)
+
+################################################################################
+## Tone mapping of density buffers
+
+def _equalize(d, gamma):
+    """ the rank of each pixel's density among the covered pixels """
+    covered = d > 0
+    out = numpy.zeros(d.shape)
+    values = numpy.sort(d[covered])
+    if len(values):
+        out[covered] = numpy.searchsorted(values, d[covered], "right") / float(len(values))
+    return out
+
+def _filmic(d, gamma):
+    # fitted ACES curve (Narkowicz 2015)
+    return (d*(2.51*d + 0.03) / (d*(2.43*d + 0.59) + 0.14)).clip(0, 1)
+
+# opacity of a pixel from its density
+tonemaps = { "exponential" : lambda d, gamma: -numpy.expm1(-d)
+           , "linear"      : lambda d, gamma: d.clip(0, 1)
+           , "gamma"       : lambda d, gamma: d.clip(0, 1) ** (1.0/gamma)
+           , "log"         : lambda d, gamma: numpy.log1p(d) / max(numpy.log1p(d.max()), 1e-300)
+           , "filmic"      : _filmic
+           , "equalize"    : _equalize
+           }
+
+def tonemap(buffer, operator="exponential", exposure=1.0, gamma=2.2, facecolor="k"):
+    """ The image of a density buffer, as saved by the native backend with
+        `hdr`, as an rgba array of floats. The density is multiplied by
+        `exposure` and mapped to opacity by `operator`, one of `tonemaps`.
+        "exponential" with exposure 1 gives the rendered image, and other
+        exposures scale the lines' density -log(1-tanalpha). The colours
+        of the lines are kept. """
+    if operator not in tonemaps:
+        raise ValueError('unknown tone mapping "{}"'.format(operator))
+    acc = raster.Accumulator(buffer.shape[:2], (0, 1, 0, 1), buffer=buffer)
+    opacity = tonemaps[operator](exposure * numpy.asarray(acc.density), gamma)
+    return acc.image(facecolor, opacity)
+
 def analyse(fname):
     # read the data
     rgb = matplotlib.image.imread(fname)
@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+"""
+Jets: truncated Taylor series, for Taylor mode automatic differentiation.
+
+A `Jet` stands in for an array of parameter values t in a user's curve
+function. Arithmetic and the supported numpy ufuncs (sin, cos, exp, ...)
+act on the Taylor coefficients instead of on values, so that running the
+function once on the jet of the identity function gives the exact Taylor
+coefficients of the function, up to the jet's degree, about every point
+of the array.
+
+@author rmj86
+"""
+
+import numpy
+from numpy import newaxis
+
+
+################################################################################
+## The Jet type
+
+class Jet(object):
+    """ Truncated Taylor series about an array of points. `c[k]` is the
+        array of coefficients of (t-a)**k, so `c` has the shape
+        (degree+1,)+shape. """
+    def __init__(self, c):
+        self.c = c
+    @classmethod
+    def variable(cls, a, n):
+        """ The jet of degree n of the identity function about the points
+            `a`, i.e. the independent variable. """
+        a = numpy.asarray(a, dtype=numpy.float64)
+        c = numpy.zeros((n+1,)+a.shape)
+        c[0] = a
+        if n >= 1:
+            c[1] = 1
+        return cls(c)
+    @property
+    def degree(self):
+        return self.c.shape[0] - 1
+    @property
+    def shape(self):
+        return self.c.shape[1:]
+    # Converting a jet to an array would silently drop all but the values.
+    # Refuse, so that functions which need real arrays fail loudly.
+    def __array__(self, dtype=None):
+        raise TypeError("Jet can not be converted to an array")
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        if method != "__call__" or kwargs:
+            return NotImplemented
+        op = _ufuncs.get(ufunc.__name__)
+        if op is None:
+            return NotImplemented
+        n = min(x.degree for x in inputs if isinstance(x, Jet))
+        cs = [_lift(x, n) for x in inputs]
+        # align the point axes, which follow the coefficient axis
+        ndim = max(c.ndim for c in cs)
+        cs = [c.reshape(c.shape[:1]+(1,)*(ndim-c.ndim)+c.shape[1:]) for c in cs]
+        return op(*cs)
+    # python operators are passed on to the ufunc implementations
+    def __add__(self, other): return numpy.add(self, other)
+    def __radd__(self, other): return numpy.add(other, self)
+    def __sub__(self, other): return numpy.subtract(self, other)
+    def __rsub__(self, other): return numpy.subtract(other, self)
+    def __mul__(self, other): return numpy.multiply(self, other)
+    def __rmul__(self, other): return numpy.multiply(other, self)
+    def __truediv__(self, other): return numpy.true_divide(self, other)
+    def __rtruediv__(self, other): return numpy.true_divide(other, self)
+    __div__ = __truediv__
+    __rdiv__ = __rtruediv__
+    def __pow__(self, other): return numpy.power(self, other)
+    def __rpow__(self, other): return numpy.power(other, self)
+    def __neg__(self): return numpy.negative(self)
+    def __pos__(self): return self
+    def __abs__(self): return numpy.absolute(self)
+    # A jet has no value to compare or test, and python 2 would compare
+    # it by its type. Refuse, so that piecewise functions fall back to
+    # numeric derivatives.
+    def _refuse(self, *args):
+        raise TypeError("Jet can not be compared or used as a truth value")
+    __lt__ = __le__ = __gt__ = __ge__ = __eq__ = __ne__ = _refuse
+    __nonzero__ = __bool__ = _refuse
+    __hash__ = object.__hash__
+
+def _lift(x, n):
+    """ coefficient array of degree n of a jet or a constant. """
+    if isinstance(x, Jet):
+        return x.c[:n+1]
+    x = numpy.asarray(x, dtype=numpy.float64)
+    c = numpy.zeros((n+1,)+x.shape)
+    c[0] = x
+    return c
+
+def taylorCoefficients(f, a, n):
+    """ Taylor coefficients of order 0..n of the function f about each of
+        the points x=a, from a single call of f on a jet. Returns an array
+        of shape a.shape+(n+1,). Raises TypeError if f can not be run on a
+        jet, e.g. when it uses an unsupported numpy function. """
+    a = numpy.asarray(a, dtype=numpy.float64)
+    y = f(Jet.variable(a, n))
+    if isinstance(y, numpy.ndarray) and y.dtype == object:
+        if y.ndim > 0:
+            raise TypeError("f returned an object array")
+        y = y[()]
+    if isinstance(y, Jet):
+        c = y.c
+    else:   # f is constant
+        c = _lift(y, n)
+    c = c.reshape(c.shape[:1]+(1,)*(a.ndim+1-c.ndim)+c.shape[1:])
+    c = numpy.broadcast_to(c, (n+1,)+a.shape)
+    return numpy.moveaxis(c, 0, -1)
+
+
+################################################################################
+## Taylor series arithmetic. The functions take and return coefficient
+## arrays of shape (n+1,)+shape.
+
+def _const(x, f):
+    """ coefficient array of the constant x, aligned with f. """
+    c = numpy.zeros((len(f),)+(1,)*(f.ndim-1))
+    c[0] = x
+    return c
+
+def _convolve(f, g, k):
+    """ coefficient k of the product of f and g. """
+    return numpy.einsum("i...,i...->...", f[:k+1], g[k::-1])
+
+def _mul(f, g):
+    f, g = numpy.broadcast_arrays(f, g)
+    h = numpy.ndarray(f.shape)
+    for k in range(len(f)):
+        h[k] = _convolve(f, g, k)
+    return h
+
+def _div(f, g):
+    f, g = numpy.broadcast_arrays(f, g)
+    h = numpy.ndarray(f.shape)
+    for k in range(len(f)):
+        h[k] = (f[k] - _convolve(g[1:], h, k-1)) / g[0] if k else f[0] / g[0]
+    return h
+
+def _add(f, g):
+    return f + g
+
+def _sub(f, g):
+    return f - g
+
+def _neg(f):
+    return -f
+
+def _abs(f):
+    return numpy.sign(f[0]) * f
+
+def _derivative(f):
+    """ coefficients of f', of one degree less. """
+    k = numpy.arange(1, len(f)).reshape((-1,)+(1,)*(f.ndim-1))
+    return k * f[1:]
+
+def _integral(h0, q):
+    """ coefficients of the function h with h(a)=h0 and h'=q, of one
+        degree more than q. """
+    k = numpy.arange(1, len(q)+1).reshape((-1,)+(1,)*(q.ndim-1))
+    h = numpy.ndarray((len(q)+1,)+q.shape[1:])
+    h[0] = h0
+    h[1:] = q / k
+    return h
+
+def _exp(f):
+    h = numpy.ndarray(f.shape)
+    h[0] = numpy.exp(f[0])
+    df = _derivative(f)
+    for k in range(1, len(f)):
+        h[k] = _convolve(df, h, k-1) / k
+    return h
+
+def _expm1(f):
+    h = _exp(f)
+    h[0] = numpy.expm1(f[0])
+    return h
+
+def _log(f):
+    return _integral(numpy.log(f[0]), _div(_derivative(f), f[:-1]))
+
+def _log1p(f):
+    g = f.copy()
+    g[0] += 1
+    return _integral(numpy.log1p(f[0]), _div(_derivative(f), g[:-1]))
+
+def _sincos(f, sign=-1):
+    """ sin and cos of f, or sinh and cosh with sign=1. """
+    s = numpy.ndarray(f.shape)
+    c = numpy.ndarray(f.shape)
+    if sign < 0:
+        s[0], c[0] = numpy.sin(f[0]), numpy.cos(f[0])
+    else:
+        s[0], c[0] = numpy.sinh(f[0]), numpy.cosh(f[0])
+    df = _derivative(f)
+    for k in range(1, len(f)):
+        s[k] = _convolve(df, c, k-1) / k
+        c[k] = sign * _convolve(df, s, k-1) / k
+    return s, c
+
+def _sin(f): return _sincos(f)[0]
+def _cos(f): return _sincos(f)[1]
+def _tan(f): return _div(*_sincos(f))
+def _sinh(f): return _sincos(f, 1)[0]
+def _cosh(f): return _sincos(f, 1)[1]
+def _tanh(f): return _div(*_sincos(f, 1))
+
+def _power(f, p):
+    if (p[1:] != 0).any():   # variable exponent
+        return _exp(_mul(p, _log(f)))
+    p = p[0]
+    if p.size == 1 and p.flat[0] == int(p.flat[0]) and 0 <= p.flat[0] <= 16:
+        # small integer powers by repeated multiplication, which is also
+        # valid where f is 0.
+        h = _const(1, f)
+        for i in range(int(p.flat[0])):
+            h = _mul(h, f)
+        return h
+    h = numpy.ndarray(numpy.broadcast(f, p).shape)
+    h[0] = f[0]**p
+    for k in range(1, len(f)):
+        j = numpy.arange(k).reshape((-1,)+(1,)*(f.ndim-1))
+        h[k] = numpy.sum((p*(k-j) - j) * f[k:0:-1] * h[:k], axis=0) / (k*f[0])
+    return h
+
+def _square(f):
+    return _mul(f, f)
+
+def _sqrt(f):
+    return _power(f, _const(0.5, f))
+
+def _reciprocal(f):
+    return _div(_const(1, f), f)
+
+def _arctan(f):
+    d = _mul(f, f)
+    d[0] += 1
+    return _integral(numpy.arctan(f[0]), _div(_derivative(f), d[:-1]))
+
+def _arcsin(f):
+    d = -_mul(f, f)
+    d[0] += 1
+    q = _div(_derivative(f), _sqrt(d)[:-1])
+    return _integral(numpy.arcsin(f[0]), q)
+
+def _arccos(f):
+    h = -_arcsin(f)
+    h[0] = numpy.arccos(f[0])
+    return h
+
+def _arcsinh(f):
+    d = _mul(f, f)
+    d[0] += 1
+    q = _div(_derivative(f), _sqrt(d)[:-1])
+    return _integral(numpy.arcsinh(f[0]), q)
+
+def compose(p, s):
+    """ coefficients of the composition p(s(t)), for the coefficient arrays
+        p of a polynomial (in the variable s-s[0]) and s of a series. """
+    ds = s.copy()
+    ds[0] = 0
+    h = _const(0, ds) + p[-1]
+    for k in range(len(p)-2, -1, -1):
+        h = _mul(h, ds)
+        h[0] += p[k]
+    return h
+
+def _wrap(op):
+    def _op(*cs):
+        return Jet(op(*cs))
+    return _op
+
+_ufuncs = dict((name, _wrap(op)) for name, op in
+    [ ("add", _add), ("subtract", _sub), ("multiply", _mul)
+    , ("true_divide", _div), ("divide", _div), ("negative", _neg)
+    , ("positive", lambda f: f), ("absolute", _abs), ("power", _power)
+    , ("square", _square), ("sqrt", _sqrt), ("reciprocal", _reciprocal)
+    , ("exp", _exp), ("expm1", _expm1), ("log", _log), ("log1p", _log1p)
+    , ("sin", _sin), ("cos", _cos), ("tan", _tan)
+    , ("sinh", _sinh), ("cosh", _cosh), ("tanh", _tanh)
+    , ("arctan", _arctan), ("arcsin", _arcsin), ("arccos", _arccos)
+    , ("arcsinh", _arcsinh)
+    ])
@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+"""
+Native rasterization of polylines into an accumulation buffer.
+
+Lines are deposited additively, as optical density: a line of alpha `a`
+which covers the fraction `cov` of a pixel adds  -log(1-a)*cov  to the
+pixel's density. The opacity of a pixel is  1-exp(-density),  which is
+exactly alpha compositing for whole pixels, but independent of the order
+the lines are drawn in. The colour of a pixel is the density weighted
+average of the colours of the lines over it.
+
+@author rmj86
+"""
+
+import numpy
+from matplotlib.colors import colorConverter
+
+# the most density a single line may deposit per pixel, for alpha 1
+maxdensity = -numpy.log(1e-4)
+# number of line pieces handled at a time
+chunksize = 1 << 20
+
+
+class Accumulator(object):
+    """ Density and colour buffers of an image of `shape` (rows, columns),
+        which shows the plane's `window` (xmin, xmax, ymin, ymax). Lines
+        are deposited by the area they cover in each pixel, across their
+        whole width, with the "box" `kernel` (their ends are cut along the
+        pixel grid rather than square), or smoothed with the "tent"
+        kernel. Both buffers are
+        views of `buffer`, of shape shape+(4,), which may be given to
+        accumulate into existing (e.g. shared) memory. """
+    def __init__(self, shape, window, kernel="box", buffer=None):
+        if kernel not in ("box", "tent"):
+            raise ValueError('unknown kernel "{}"'.format(kernel))
+        self.shape = tuple(shape)
+        self.window = tuple(window)
+        self.kernel = kernel
+        if buffer is None:
+            buffer = numpy.zeros(self.shape+(4,))
+        self.buffer = buffer
+        self.density = buffer[...,0]
+        self.color = buffer[...,1:]
+    def toPixels(self, xy):
+        """ pixel coordinates (column, row) of the points `xy`, with pixel
+            (i, j) covering [i, i+1]x[j, j+1]. """
+        (xmin, xmax, ymin, ymax) = self.window
+        (h, w) = self.shape
+        px = numpy.empty(xy.shape, dtype=numpy.result_type(xy, numpy.float32))
+        px[...,0] = (xy[...,0] - xmin) * (w / float(xmax-xmin))
+        px[...,1] = (ymax - xy[...,1]) * (h / float(ymax-ymin))
+        return px
+    def addPolylines(self, polylines, colors, width, alpha=None, weight=1.0):
+        """ Deposit polylines, an array of shape (m, k, 2) or a list of
+            arrays of shape (k_i, 2), of the rgba `colors` (one per
+            polyline) and line `width` in pixels. `alpha` overrides the
+            colours' alpha, and `weight` scales the deposited density. """
+        if len(polylines) == 0:
+            return
+        if isinstance(polylines, numpy.ndarray):
+            counts = numpy.full(len(polylines), polylines.shape[1])
+            vertices = polylines.reshape(-1, 2)
+        else:
+            counts = numpy.array([len(p) for p in polylines])
+            vertices = numpy.concatenate(polylines)
+        colors = numpy.asarray(colors, dtype=numpy.float64).reshape(-1, 4)
+        colors = numpy.broadcast_to(colors, (len(counts), 4))
+        # segments between consecutive vertices of the same polyline
+        ends = numpy.cumsum(counts)
+        start = numpy.ones(len(vertices), dtype=bool)
+        start[ends-1] = False
+        start = numpy.flatnonzero(start)
+        p = self.toPixels(vertices)
+        owner = numpy.repeat(numpy.arange(len(counts)), counts)[start]
+        self.addSegments(p[start], p[start+1], colors[owner], width, alpha, weight)
+    def addSegments(self, p0, p1, colors, width, alpha=None, weight=1.0):
+        """ Deposit the line segments p0-p1, in pixel coordinates. Lines
+            wider than a pixel are drawn as ceil(width) parallel lines
+            across their width. """
+        a = colors[:,3] if alpha is None else numpy.full(len(colors), alpha)
+        d = lineDensity(a) * weight
+        rgb = colors[:,:3]
+        lines = int(numpy.ceil(width))
+        if lines > 1:
+            v = p1 - p0
+            length = numpy.sqrt((v*v).sum(axis=1))[:,numpy.newaxis]
+            normal = v[:,::-1] * [-1, 1] / numpy.where(length > 0, length, 1)
+            for j in range(lines):
+                offset = normal * width * ((j+0.5)/lines - 0.5)
+                self._addThin(p0+offset, p1+offset, d, rgb, float(width)/lines)
+        else:
+            self._addThin(p0, p1, d, rgb, width)
+    def _addThin(self, p0, p1, density, rgb, width):
+        """ Deposit lines of at most a pixel's width, in bounded chunks.
+            The lines are clipped to the image first, so that the work is
+            that of their visible parts. """
+        (h, w) = self.shape
+        # lines up to a pixel outside still cover the pixels at the border
+        (u0, u1, index) = clipSegments(p0, p1, (-1, w+1, -1, h+1))
+        p0, p1, density, rgb = p0[index], p1[index], density[index], rgb[index]
+        v = p1 - p0
+        q0, q1 = p0 + v * u0[:,numpy.newaxis], p0 + v * u1[:,numpy.newaxis]
+        pieces = ( abs(numpy.floor(q1) - numpy.floor(q0)).sum(axis=1)
+                   .astype(int) + 1 )
+        if self.kernel != "tent":
+            # and the crossings of the edges across the minor axis
+            (minor, half) = crossSections(v, width)
+            k = numpy.arange(len(v))
+            pieces += 2 * ( abs(numpy.floor(q1[k,minor]) - numpy.floor(q0[k,minor]))
+                            .astype(int) + 1 )
+        bounds = numpy.searchsorted( numpy.cumsum(pieces)
+                                   , numpy.arange(chunksize, pieces.sum(), chunksize) )
+        for i0, i1 in zip( numpy.concatenate([[0], bounds])
+                         , numpy.concatenate([bounds, [len(pieces)]]) ):
+            sl = slice(i0, i1)
+            self._deposit(p0[sl], p1[sl], u0[sl], u1[sl], density[sl], rgb[sl], width)
+    def _deposit(self, p0, p1, u0, u1, density, rgb, width):
+        """ Split the parts u0..u1 of the segments where they cross the
+            pixel grid, and deposit the density times the area of each
+            piece into the pixels it covers (see `cover`), or with the
+            tent kernel shared among the 4 nearest pixel centres. """
+        if len(p0) == 0:
+            return
+        v = p1 - p0
+        length = numpy.sqrt((v*v).sum(axis=1))
+        (minor, half) = crossSections(v, width)
+        # the parameters u in u0..u1 of the parts' ends and of the
+        # crossings with the grid lines of their centrelines, and for the
+        # box kernel of their edges across the minor axis, sorted by the
+        # keys 2*segment+u
+        index = numpy.arange(0, 2*len(p0), 2.0)
+        keys = [index + u0, index + u1]
+        lines = [(k, numpy.arange(len(p0)), 0) for k in (0, 1)]
+        if self.kernel != "tent":
+            for k in (0, 1):
+                sel = numpy.flatnonzero(minor == k)
+                lines += [(k, sel, -half[sel]), (k, sel, half[sel])]
+        for (k, sel, shift) in lines:
+            x0 = p0[sel,k] + shift
+            f0 = numpy.floor(x0 + v[sel,k]*u0[sel])
+            f1 = numpy.floor(x0 + v[sel,k]*u1[sel])
+            n = abs(f1 - f0).astype(int)
+            i = numpy.repeat(numpy.arange(len(sel)), n)
+            j = numpy.arange(len(i)) - numpy.repeat(numpy.cumsum(n) - n, n)
+            grid = numpy.where(f1[i] > f0[i], f0[i] + 1 + j, f0[i] - j)
+            (s, u) = (sel[i], (grid - x0[i]) / v[sel[i],k])
+            keys.append(2*s + numpy.clip(u, u0[s], u1[s]))
+        keys = numpy.sort(numpy.concatenate(keys))
+        seg = (keys // 2).astype(int)
+        # pieces between consecutive parameters of the same segment
+        same = seg[1:] == seg[:-1]
+        seg, a, b = seg[1:][same], (keys[:-1] - 2*seg[:-1])[same], (keys[1:] - 2*seg[1:])[same]
+        mid = p0[seg] + v[seg] * ((a+b)/2)[:,numpy.newaxis]
+        dens = density[seg] * length[seg] * (b-a) * width
+        if self.kernel == "tent":
+            self.splat(mid, dens, rgb[seg])
+        else:
+            self.cover(mid, minor[seg], half[seg], dens, rgb[seg])
+    def cover(self, mid, minor, half, density, rgb):
+        """ Deposit the density of pieces of lines, centred on `mid`, into
+            the pixels they cover. Each piece lies within a pixel's column
+            (or row, for the axis `minor` 0) and has a cross-section along
+            it from mid-`half` to mid+`half`, see `crossSections`, whose
+            edges cross no grid line within the piece; its density is
+            shared among the up to 3 pixels the cross-section overlaps, by
+            the length of the overlap, which is the exact share of its
+            area in each. """
+        index = numpy.arange(len(mid))
+        centre = mid[index,minor]
+        (lo, hi) = (centre - half, centre + half)
+        first = numpy.floor(lo)
+        pixels = numpy.floor(mid).astype(int)
+        parts = []
+        for k in range(3):
+            cell = first + k
+            overlap = (numpy.minimum(hi, cell+1) - numpy.maximum(lo, cell)).clip(0)
+            share = numpy.where(hi > lo, overlap / numpy.where(hi > lo, hi-lo, 1), k == 0)
+            sel = numpy.flatnonzero(share > 0)
+            px = pixels[sel]
+            px[numpy.arange(len(sel)),minor[sel]] = cell[sel]
+            parts.append((px, density[sel]*share[sel], rgb[sel]))
+        self.deposit(*[numpy.concatenate(p) for p in zip(*parts)])
+    def addPoints(self, points, colors, area, alpha=None, weight=1.0):
+        """ Deposit points, in the plane's coordinates, each standing for
+            `area` pixels of a line of the rgba `colors`, into the pixel it
+            is in: a coarse but fast stand-in for lines. The points are of
+            shape (n, 2) with a colour each, or (m, k, 2) with a colour
+            per row of k points. `alpha` and `weight` are as in
+            `addPolylines`. """
+        a = colors[:,3] if alpha is None else numpy.full(len(colors), alpha)
+        d = lineDensity(a) * weight
+        if area.ndim == 2:
+            d = d[:,numpy.newaxis]
+        pixels = numpy.floor(self.toPixels(points)).astype(int)
+        self.deposit(pixels, d * area, colors[:,:3])
+    def deposit(self, pixels, density, rgb):
+        """ Add density to the `pixels` (column, row), of the colours
+            `rgb`, one per pixel, or with pixels of shape (m, k, 2) one
+            per row of k pixels. """
+        (h, w) = self.shape
+        inside = ( (pixels[...,0] >= 0) & (pixels[...,0] < w)
+                   & (pixels[...,1] >= 0) & (pixels[...,1] < h) )
+        index = (pixels[...,1]*w + pixels[...,0])[inside]
+        self.density += numpy.bincount(index, density[inside], h*w).reshape(h, w)
+        if density.ndim == 2:
+            rgb = rgb[:,numpy.newaxis]
+        for k in range(3):
+            weights = (density * rgb[...,k])[inside]
+            self.color[...,k] += numpy.bincount(index, weights, h*w).reshape(h, w)
+    def splat(self, pts, density, rgb):
+        """ Deposit density at the points `pts` (pixel coordinates), shared
+            bilinearly among the 4 nearest pixel centres. """
+        (h, w) = self.shape
+        f = pts - 0.5
+        i = numpy.floor(f).astype(int)
+        f -= i
+        # accumulate on a grid with a border of one pixel, so that all 4
+        # neighbours of the points that touch the image are on the grid
+        inside = (i[:,0] >= -1) & (i[:,0] < w) & (i[:,1] >= -1) & (i[:,1] < h)
+        i, f, density, rgb = i[inside], f[inside], density[inside], rgb[inside]
+        index = (i[:,1]+1)*(w+2) + i[:,0]+1
+        index = numpy.concatenate([index, index+1, index+w+2, index+w+3])
+        fx, fy = f[:,0], f[:,1]
+        share = numpy.concatenate([(1-fx)*(1-fy), fx*(1-fy), (1-fx)*fy, fx*fy])
+        dens = numpy.tile(density, 4) * share
+        size = (h+2)*(w+2)
+        def accumulate(weights):
+            grid = numpy.bincount(index, weights, size).reshape(h+2, w+2)
+            return grid[1:-1,1:-1]
+        self.density += accumulate(dens)
+        rgb = numpy.tile(rgb, (4, 1))
+        for k in range(3):
+            self.color[...,k] += accumulate(dens*rgb[:,k])
+    def opacity(self):
+        return -numpy.expm1(-self.density)
+    def image(self, facecolor="k", opacity=None):
+        """ The accumulated lines over the background `facecolor`, as an
+            rgba array of floats. `opacity` replaces the opacity of the
+            pixels, e.g. by a tone mapping of the density. """
+        bg = numpy.array(colorConverter.to_rgba(facecolor))
+        if opacity is None:
+            opacity = self.opacity()
+        a = opacity[...,numpy.newaxis]
+        d = self.density[...,numpy.newaxis]
+        rgb = self.color / numpy.where(d > 0, d, 1)
+        img = numpy.empty(self.shape+(4,))
+        img[...,:3] = rgb*a + bg[:3]*bg[3]*(1-a)
+        img[...,3] = a[...,0] + bg[3]*(1-a[...,0])
+        img[...,:3] /= numpy.where(img[...,3:] > 0, img[...,3:], 1)
+        return img.clip(0, 1)
+
+def clipSegments(p0, p1, box):
+    """ The parts of the segments p0-p1 inside `box` (xmin, xmax, ymin,
+        ymax), by Liang-Barsky, as the parameters (u0, u1) of the parts
+        along the segments and the index of the segments which have one.
+        Segments with non-finite ends are dropped. """
+    v = p1 - p0
+    u0 = numpy.zeros(len(p0))
+    u1 = numpy.ones(len(p0))
+    keep = numpy.isfinite(p0).all(axis=1) & numpy.isfinite(p1).all(axis=1)
+    with numpy.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        for k, lo, hi in ((0, box[0], box[1]), (1, box[2], box[3])):
+            # a segment enters through one bound and leaves through the
+            # other, depending on its direction
+            for p, q in ((-v[:,k], p0[:,k] - lo), (v[:,k], hi - p0[:,k])):
+                u = q / p
+                keep &= (p != 0) | (q >= 0)
+                u0 = numpy.where(p < 0, numpy.maximum(u0, u), u0)
+                u1 = numpy.where(p > 0, numpy.minimum(u1, u), u1)
+    index = numpy.flatnonzero(keep & (u0 <= u1))
+    return u0[index], u1[index], index
+
+def crossSections(v, width):
+    """ The minor axis of the directions `v`, the one along which they
+        change least, and the half length of the cross-sections of lines
+        of `width` along it. """
+    minor = (abs(v[:,0]) >= abs(v[:,1])).astype(int)
+    length = numpy.sqrt((v*v).sum(axis=1))
+    major = abs(v[numpy.arange(len(v)),1-minor])
+    return minor, width / 2.0 * length / numpy.where(major > 0, major, 1)
+
+def lineDensity(alpha):
+    """ density per unit of covered area of lines of opacity `alpha` """
+    return -numpy.log1p(-numpy.minimum(alpha, -numpy.expm1(-maxdensity)))
+
+def over(top, bottom):
+    """ alpha composite the rgba image `top` over `bottom`. """
+    a = top[...,3:]
+    out = numpy.empty(bottom.shape)
+    out[...,3:] = a + bottom[...,3:]*(1-a)
+    out[...,:3] = top[...,:3]*a + bottom[...,:3]*bottom[...,3:]*(1-a)
+    out[...,:3] /= numpy.where(out[...,3:] > 0, out[...,3:], 1)
+    return out
@@ -12,13 +12,16 @@ import matplotlib
 matplotlib.use("agg")
 from matplotlib import pyplot
 import misc
+import raster
 import image
+import cache
 import colormix
 import curve
 import types
 from matplotlib.collections import LineCollection
 from matplotlib.colors import colorConverter
 import copy
+import multiprocessing
 
 tau = 2 * numpy.pi
 
@@ -29,11 +32,16 @@ class TaylorBundle(object):
              , "showcurve", "curveres", "curvecol", "curvelw"
              , "curvealpha", "tandomain", "tanres", "tancol"
              , "tanlw", "tanalpha", "filename", "keep_partials"
+             , "arclength", "tanerror", "clip", "backend", "tanfilter"
+             , "workers", "max_tile_pixels", "hdr", "cache", "cache_size"
+             , "keep_layers", "chunk_size", "max_memory", "float32"
+             , "symmetry"
              }
     curve = None
     n_part = 1               # number of partial images to render
     n_tan = 200              # number of tangents per partial image
     degree = 1               # polynomial degree of tangents
+    arclength = False        # space the tangents evenly along the curve
     domain = (0, tau)        # domain of curve and tangent space
     curvedomain = (0, tau)   # domain of generating curve
     bundledomain = (0, tau)  # domain of tangent bundle
@@ -47,14 +55,43 @@ class TaylorBundle(object):
     curvelw = 6              # line width of generating curve
     curvealpha = None        # transparency of generating curve
     tandomain = [-2, 2]      # domain of tangent polynomial (around the point of tangency)
-    tanres = 256             # resolution of tangent curves
+    tanres = 256             # (maximum) resolution of tangent curves
+    tanerror = 0.25          # max distance of tangent polylines from the curves, in pixels
+    clip = True              # only sample the parts of tangents inside the window
     tancol = "r"  # colour of tangents. Can be constant or generating function
     tanlw = 1                # line width of tangents
     tanalpha = None          # tranparency of tangents
     filename = None          # file name to save to. Defaults to date and time
     keep_partials = False    # keep partial files after render finishes
+    backend = "matplotlib"   # draw tangents with "matplotlib" or the "native" rasterizer
+    tanfilter = "box"        # pixel filter of the native rasterizer: "box" or "tent"
+    workers = 1              # number of processes to render partials in
+    max_tile_pixels = None   # render in tiles of at most this many pixels
+    hdr = False              # also save the native backend's density buffer
+    cache = None             # directory to cache intermediate results in
+    cache_size = 1 << 30     # maximum size of the cache, in bytes
+    keep_layers = True       # keep the layers of the last render in memory
+    chunk_size = None        # number of tangents of a partial to draw at a time
+    max_memory = None        # draw as many tangents at a time as fit in this many bytes
+    float32 = False          # compute the vertices of tangents in single precision
+    symmetry = False         # draw only a part of a symmetric bundle, and mirror it
+    _layers = None
+    _samples = None
     def __init__(self, **options):
+        object.__setattr__(self, "_layers", {})
+        object.__setattr__(self, "_samples", {})
         self.set_options(**options)
+    def __getstate__(self):
+        # the kept layers and sampled costs aren't copied, nor sent to
+        # worker processes
+        state = self.__dict__.copy()
+        state.pop("_layers", None)
+        state.pop("_samples", None)
+        return state
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        object.__setattr__(self, "_layers", {})
+        object.__setattr__(self, "_samples", {})
     def set_options(self, **options):
         for o,v in options.items():
             setattr(self, o, v)
@@ -65,6 +102,8 @@ class TaylorBundle(object):
             self.curvedomain  = value
             self.bundledomain = value
         object.__setattr__(self, attr, value)
+        # the sampled costs of `estimate` are those of the options before
+        object.__setattr__(self, "_samples", {})
     def initializeFigure(self, figsize):
         """ initialize the plotting surface """
         fig = pyplot.gcf()
@@ -73,37 +112,308 @@ class TaylorBundle(object):
         ax = pyplot.gca()
         ax.set_position([0,0,1,1])
         return fig
-    def initializeAxes(self):
+    def initializeAxes(self, window=None):
         """ clear and set properties of current axes """
         ax = pyplot.gca()
         ax.clear()
-        ax.axis(self.window)
+        ax.axis(self.window if window is None else window)
         ax.axis("off")
         return ax
-    # @timed(showargs=False)
-    def drawTangents(self, ax, tmin, tmax, n_tan):
+    def tangentCurve(self):
+        """ the curve to take the tangents of: the generating curve, or
+            with `arclength` its reparametrization by arc length over
+            `bundledomain`. """
+        if self.arclength:
+            return curve.ArcLengthCurve(self.curve, self.bundledomain)
+        return self.curve
+    def pixelScale(self, figsize=None):
+        """ pixels per unit length along the x and y axes """
+        (w, h) = self.figsize if figsize is None else figsize
+        (xmin, xmax, ymin, ymax) = self.window
+        return numpy.array([ w * self.dpi / float(xmax-xmin)
+                           , h * self.dpi / float(ymax-ymin) ])
+    def clipWindow(self, figsize=None, window=None):
+        """ the window (or a part of it), widened by the line width of
+            tangents and the polyline error, so that clipping leaves no
+            visible ends """
+        margin = (self.tanlw * self.dpi / 72.0 / 2 + (self.tanerror or 0) + 1)
+        (mx, my) = margin / self.pixelScale(figsize)
+        (xmin, xmax, ymin, ymax) = self.window if window is None else window
+        return (xmin-mx, xmax+mx, ymin-my, ymax+my)
+    def tangentCoefficients(self, tmin, tmax, n_tan, tcurve=None):
+        """ Taylor coefficients and colours of the tangents at n_tan points
+            in tmin..tmax, in the order they are drawn in. """
+        arrays = self.cached( "coefficients", (tmin, tmax, n_tan)
+                            , lambda: self._tangentCoefficients(tmin, tmax, n_tan, tcurve) )
+        return arrays["coeffs"], arrays["colors"]
+    def _tangentCoefficients(self, tmin, tmax, n_tan, tcurve):
+        if tcurve is None:
+            tcurve = self.tangentCurve()
         # function paramter values
-        t = numpy.linspace(tmin, tmax, n_tan, False)
-        t = misc.permute(t)
-        # color array
+        order = misc.fibpermut(n_tan)
+        t = numpy.linspace(tmin, tmax, n_tan, False)[order]
+        # calculate taylor curves' coordinates, for all tangents at once.
+        # The coefficients are computed on the regular grid, which lets
+        # Fourier curves use the FFT, and then permuted like t.
+        # s are the offsets from the points of tangency.
+        coeffs = tcurve.gridTaylorCoefficients(tmin, tmax, n_tan, self.degree)
+        coeffs = coeffs[order]
+        return {"coeffs": coeffs, "colors": self.tangentColors(t, tcurve)}
+    def tangentColors(self, t, tcurve):
+        """ the colours of the tangents at t, by the parameter of the
+            generating curve """
         cmix = colormix.fromConstant(self.tancol)
-        colors = cmix(t)
-        # calculate taylor curves' coordinates
-        taylorcoords = numpy.ndarray((n_tan, self.tanres, 2))
+        if self.arclength:
+            return cmix(tcurve.parameterAt(t))
+        return cmix(t)
+    def tangentPolylines( self, tmin, tmax, n_tan, tcurve=None, figsize=None
+                        , window=None, tangents=None ):
+        """ vertices and colours of the tangents at n_tan points in
+            tmin..tmax, or of the given `tangents` (coefficients, colours),
+            as seen in `window`. The vertices are an array of shape
+            (n, k, 2) or a list of n arrays of shape (k_i, 2). """
+        if tangents is None:
+            # only the polylines of whole partials are cached
+            arrays = self.cached( "polylines", (tmin, tmax, n_tan, figsize, window)
+                                , lambda: _packPolylines(*self.tangentPolylines(
+                                      tmin, tmax, n_tan, tcurve, figsize, window
+                                    , self.tangentCoefficients(tmin, tmax, n_tan, tcurve) )) )
+            return _unpackPolylines(arrays)
+        (coeffs, colors) = tangents
         (amin, amax) = self.tandomain
-        for i, a in enumerate(t):
-            s = numpy.linspace(a+amin, a+amax, self.tanres)
-            p = self.curve.taylorCurve(a, self.degree)
-            taylorcoords[i,:,0] = p.x(s)
-            taylorcoords[i,:,1] = p.y(s)
-        # taylor curve collection
-        taylorcurves = LineCollection( taylorcoords
-                                     , colors = colors
-                                     , lw = self.tanlw
-                                     , alpha = self.tanalpha
-                                     , zorder = 0 )
-        # add collection to current axes
-        ax.add_collection(taylorcurves)
+        if window is None and not self.clip and self.tanerror is None:
+            # all curves on the same offsets
+            s = numpy.linspace(amin, amax, self.tanres)
+            vander = curve.vandermonde(s, self.degree)
+            if self.float32:
+                (coeffs, vander) = (coeffs.astype(numpy.float32), vander.astype(numpy.float32))
+            return curve.taylorVertices(coeffs, vander), colors
+        (index, lo, hi, segments) = self.tangentPieces(coeffs, figsize)
+        coeffs, colors = coeffs[index], colors[index]
+        # the pieces are found in double precision, only the vertices are
+        # single
+        dtype = numpy.float32 if self.float32 else numpy.float64
+        first = count = None
+        if window is not None:
+            # the parts of the pieces inside a tile of the image, with the
+            # vertices of the whole pieces
+            (piece, first, count) = curve.restrictPieces(
+                coeffs, lo, hi, segments, self.clipWindow(figsize, window) )
+            coeffs, colors = coeffs[piece], colors[piece]
+            lo, hi, segments = lo[piece], hi[piece], segments[piece]
+        taylorcoords = curve.taylorPolylines( coeffs.astype(dtype, copy=False)
+                                            , lo, hi, segments, first, count )
+        return taylorcoords, colors
+    def tangentChunks( self, tmin, tmax, n_tan, tcurve=None, figsize=None
+                     , window=None, tangents=None ):
+        """ the polylines and colours of `tangentPolylines`, in chunks of
+            at most `chunkSize` tangents, so that only one chunk is in
+            memory at a time. Without `tangents` each chunk is made from
+            its points of tangency on: its coefficients, colours and
+            vertices. """
+        chunk = self.chunkSize(n_tan, figsize)
+        if chunk >= n_tan:
+            yield self.tangentPolylines(tmin, tmax, n_tan, tcurve, figsize, window, tangents)
+            return
+        if tangents is not None:
+            (coeffs, colors) = tangents
+            for c0 in range(0, len(coeffs), chunk):
+                part = (coeffs[c0:c0+chunk], colors[c0:c0+chunk])
+                yield self.tangentPolylines( tmin, tmax, n_tan, tcurve, figsize
+                                           , window, part )
+            return
+        if tcurve is None:
+            tcurve = self.tangentCurve()
+        # the points of the grid in the order of the whole partial, as in
+        # `tangentCoefficients`, but not on the grid at once
+        order = misc.fibpermut(n_tan)
+        dt = (tmax - tmin) / float(n_tan)
+        for c0 in range(0, n_tan, chunk):
+            t = tmin + order[c0:c0+chunk] * dt
+            part = (tcurve.taylorCoefficients(t, self.degree), self.tangentColors(t, tcurve))
+            yield self.tangentPolylines( tmin, tmax, n_tan, tcurve, figsize
+                                       , window, part )
+    def chunkSize(self, n_tan, figsize=None):
+        """ the number of tangents to draw at a time: `chunk_size`, and
+            with `max_memory` at most as many as fit in it (see
+            `estimate`) """
+        chunk = n_tan if self.chunk_size is None else min(n_tan, self.chunk_size)
+        if self.max_memory is not None:
+            estimate = self.estimate(figsize, n_tan)
+            if estimate["memory"] > self.max_memory:
+                raise MemoryError( "rendering needs about {} MB, more than max_memory, "
+                                   "even a tangent at a time".format(estimate["memory"] >> 20) )
+            chunk = min(chunk, estimate["chunk"])
+        return max(1, chunk)
+
+    # Rough costs of rendering, per backend, for `estimate`, measured on
+    # a desktop machine. The memory in bytes of a process before it
+    # renders, per pixel of compositing the image and of rendering a
+    # partial, per number in the tangents' coefficients and colours, per
+    # tangent and vertex of the polylines drawn at a time, per vertex
+    # more for lines wider than a pixel, and per piece of a segment in a
+    # pixel, of which the native rasterizer holds at most
+    # `raster.chunksize` at a time. The native vertex is mostly the
+    # rasterizer's arrays per segment: the vertices in pixels, the ends
+    # and colour of each segment and their clipped copies, which it
+    # holds while it deposits the pieces; wide lines are drawn as
+    # several thin ones, from offset copies of the ends. A native piece
+    # is the most of either filter, which share it among up to 4 pixels.
+    # The time in seconds of starting a process, and per the same.
+    memoryCosts = { "native":     dict( process=64e6, pixel=210, partial=64, number=24
+                                      , tangent=100, vertex=340, wide=90, piece=460 )
+                  , "matplotlib": dict( process=64e6, pixel=210, partial=64, number=24
+                                      , tangent=1300, vertex=24, wide=0, piece=0 )
+                  }
+    timeCosts = { "native":     dict( process=0.2, pixel=1.1e-6, partial=1e-7
+                                    , number=1e-8, tangent=1e-5, vertex=1e-6, piece=4.5e-7 )
+                , "matplotlib": dict( process=0.2, pixel=6.5e-7, partial=1e-7
+                                    , number=1e-8, tangent=3e-5, vertex=1e-6, piece=6e-8 )
+                }
+    estimateSample = 64      # number of tangents to measure the polylines of
+
+    def sampleCosts(self, figsize, n_tan):
+        """ the mean number of vertices and of pieces (segments split at
+            the pixel grid, see `raster.Accumulator`) of the polylines of a sample of the n_tan
+            tangents. They are measured once until an option is set. """
+        m = min(n_tan, self.estimateSample)
+        if (figsize, m) in self._samples:
+            return self._samples[figsize, m]
+        tmin, tmax = self.bundledomain
+        vertices = pieces = 0.0
+        if m > 0:
+            arrays = self._tangentCoefficients(tmin, tmax, m, None)
+            polylines, colors = self.tangentPolylines( tmin, tmax, m, None, figsize
+                                                     , tangents=(arrays["coeffs"], arrays["colors"]) )
+            scale = self.pixelScale(figsize)
+            lines = numpy.ceil(self.tanlw * self.dpi / 72.0)
+            # the native box filter also splits the segments where their
+            # edges cross the grid across their minor axis
+            edges = 2 if self.backend == "native" and self.tanfilter == "box" else 0
+            for p in polylines:
+                vertices += len(p)
+                d = abs(numpy.diff(p * scale, axis=0))
+                pieces += lines * (d.sum() + len(p) + edges * (d.min(axis=1) + 1).sum())
+            vertices, pieces = vertices / m, pieces / m
+        self._samples[figsize, m] = (vertices, pieces)
+        return vertices, pieces
+
+    def estimate(self, figsize=None, n_tan=None):
+        """ the predicted peak memory and time of `render`, without
+            rendering, from the options and the polylines of a sample of
+            the tangents (see `sampleCosts`), with n_tan tangents per
+            partial (`n_tan` by default). Returns a dict of the "memory"
+            in bytes, of all processes, the "seconds", the "pixels" of the
+            image (or of a tile), the mean "vertices" and "pieces"
+            (segments split at the pixel grid) per tangent, and the
+            "chunk" of tangents drawn at a time, which with `max_memory`
+            is as many as fit in it. """
+        figsize = tuple(self.figsize if figsize is None else figsize)
+        n_part = self.n_part
+        n_tan = self.n_tan if n_tan is None else n_tan
+        self.checkBackend()
+        (w, h) = (int(figsize[0] * self.dpi), int(figsize[1] * self.dpi))
+        pixels = w * h
+        if self.max_tile_pixels is not None and pixels > self.max_tile_pixels:
+            (tw, th) = self.tileSize(w, h)
+            apron = self.tileApron()
+            pixels = (min(w, tw) + 2*apron) * (min(h, th) + 2*apron)
+        (vertices, pieces) = self.sampleCosts(figsize, n_tan)
+        numbers = (self.degree+1) * 2 + 4
+        mc = self.memoryCosts[self.backend]
+        # the vertices and their temporaries take about a fifth less in
+        # single precision
+        vertex = 0.8 if self.float32 else 1.0
+        # lines wider than a pixel are drawn as several thin lines, one at
+        # a time
+        lines = numpy.ceil(self.tanlw * self.dpi / 72.0)
+        if lines > 1:
+            vertex += mc["wide"] / float(mc["vertex"])
+        workers = min(self.workers, n_part) if n_part else 1
+        # memory: the peak of drawing a chunk of a partial, or of
+        # compositing the image
+        def memory(chunk):
+            # chunks are made from their points on, in the order of all
+            # the tangents
+            order = 16 * n_tan if chunk < n_tan else 0
+            drawing = ( mc["partial"] * pixels + order
+                      + chunk * ( mc["number"] * numbers + mc["tangent"]
+                                + mc["vertex"] * vertex * vertices )
+                      + mc["piece"] * min(chunk * pieces / lines, raster.chunksize) )
+            if workers > 1:
+                # the workers' buffers are summed through 2 shared slots each
+                main = mc["process"] + max(mc["pixel"], (1 + 2*workers) * 32) * pixels
+                return main + workers * (mc["process"] + drawing)
+            return mc["process"] + max(mc["pixel"] * pixels, drawing)
+        chunk = n_tan if self.chunk_size is None else min(n_tan, self.chunk_size)
+        if self.max_memory is not None:
+            # memory grows with the chunk
+            (lo, hi) = (1, max(1, chunk))
+            while lo < hi:
+                mid = (lo + hi + 1) // 2
+                if memory(mid) <= self.max_memory:
+                    lo = mid
+                else:
+                    hi = mid - 1
+            chunk = lo
+        # time: the partials, shared among the workers, and compositing
+        tc = self.timeCosts[self.backend]
+        partial = ( tc["partial"] * pixels
+                  + n_tan * ( tc["number"] * numbers + tc["tangent"] + tc["vertex"] * vertices
+                            + tc["piece"] * pieces ) )
+        seconds = ( n_part * partial / max(1, workers) + tc["pixel"] * w * h
+                    + tc["process"] * max(1, workers) )
+        return { "memory": int(memory(max(1, chunk))), "seconds": seconds, "pixels": pixels
+               , "vertices": vertices, "pieces": pieces, "chunk": chunk }
+    def tangentPieces(self, coeffs, figsize=None):
+        """ The pieces of the tangents to draw, as arrays (index, lo, hi,
+            segments): the tangent, its range of offsets, and the number
+            of polyline segments. """
+        (amin, amax) = self.tandomain
+        if self.clip:
+            # the visible pieces of the curves. Tangents which are never
+            # inside the window are dropped.
+            (index, lo, hi) = curve.visibleIntervals(
+                coeffs, amin, amax, self.clipWindow(figsize) )
+        else:
+            index = numpy.arange(len(coeffs))
+            lo, hi = numpy.full(len(coeffs), amin, dtype=float), numpy.full(len(coeffs), amax, dtype=float)
+        if self.tanerror is not None:
+            # as few vertices per curve as keep it within tanerror pixels
+            segments = curve.taylorSegments( coeffs[index] * self.pixelScale(figsize)
+                                           , lo, hi, self.tanerror
+                                           , self.tanres-1 )
+        else:
+            # tanres vertices per curve, shared among its visible pieces
+            fraction = (hi-lo) / float(amax-amin)
+            segments = numpy.maximum(1, numpy.round(fraction*(self.tanres-1))).astype(int)
+        return index, lo, hi, segments
+    # @timed(showargs=False)
+    def drawTangents( self, ax, tmin, tmax, n_tan, tcurve=None, figsize=None
+                    , window=None, tangents=None ):
+        """ add the tangents to ax, in one collection, or draw them on the
+            canvas a chunk at a time if they come in several. The canvas
+            must have been drawn then. """
+        chunks = self.tangentChunks(tmin, tmax, n_tan, tcurve, figsize, window, tangents)
+        self.drawPolylines(ax, chunks, self.chunkSize(n_tan, figsize) < n_tan)
+
+    def drawPolylines(self, ax, chunks, immediate=False):
+        """ add the polylines and colours of `chunks` to ax, a collection
+            each, or with `immediate` draw them on the canvas one at a
+            time """
+        for taylorcoords, colors in chunks:
+            # taylor curve collection
+            taylorcurves = LineCollection( taylorcoords
+                                         , colors = colors
+                                         , lw = self.tanlw
+                                         , alpha = self.tanalpha
+                                         , zorder = 0 )
+            # add collection to current axes
+            ax.add_collection(taylorcurves)
+            if immediate:
+                # drawn over what is on the canvas, and dropped
+                ax.draw_artist(taylorcurves)
+                taylorcurves.remove()
 
     def drawCurve(self, ax):
         if type(self.curvecol) == types.FunctionType:
@@ -145,7 +455,6 @@ class TaylorBundle(object):
     def render(self, preview=False, scale=0.25):
         filename, figsize = self.filename, self.figsize,
         n_part, n_tan = self.n_part, self.n_tan
-        tmin, tmax = self.bundledomain
         # initialize filename
         if not type(filename) == str:
             filename = misc.datetimeFilename(pre="taylorbundle_render_")
@@ -160,25 +469,668 @@ class TaylorBundle(object):
         fig = self.initializeFigure(figsize)
         # render partials
         # --------
+        ds = self.partialOffsets(n_tan, n_part)
+        self.checkBackend()
+        (w, h) = fig.canvas.get_width_height()
+        if self.max_tile_pixels is not None and w*h > self.max_tile_pixels:
+            self.renderTiled(fig, filename, figsize, ds, n_tan)
+            return
+        total = self.renderBundle(fig, filename, figsize, ds, n_tan)
+        self.saveComposite(fig, filename, total, len(ds))
+
+    def renderImage(self):
+        """ render the image and return it as an rgba array of floats,
+            without saving it """
+        fig = self.initializeFigure(self.figsize)
+        ds = self.partialOffsets(self.n_tan, self.n_part)
+        self.checkBackend()
+        total = self.renderBundle(fig, None, self.figsize, ds, self.n_tan)
+        return self.composite(fig, total, len(ds))
+
+    previewPoints = 1 << 20  # most points a preview samples in all
+
+    def preview(self, scale=0.25, samples=16, save=False):
+        """ a quick sketch of the image at `scale` times its size, as an
+            rgba array of floats, and with `save` also saved to
+            `<filename>_preview<scale>.png`. Instead of drawing lines, the
+            tangents of all partials are sampled at `samples` jittered
+            offsets each, or fewer so that there are at most
+            `previewPoints`, and the points are binned into a density
+            buffer like that of the native backend, each weighted by the
+            length of tangent it stands for. The generating curve is drawn
+            on top as usual, but not kept (see `keep_layers`). """
+        figsize = (scale * self.figsize[0], scale * self.figsize[1])
+        # at a lower dpi rather than size, so that the line widths scale
+        # with the image
+        fig = self.initializeFigure(self.figsize)
+        fig.set_dpi(self.dpi * scale)
+        (w, h) = fig.canvas.get_width_height()
+        acc = raster.Accumulator((h, w), self.window)
+        # the tangents of all partials are one grid
+        n = self.n_part * self.n_tan
+        samples = max(1, min(samples, self.previewPoints // max(1, n)))
+        tmin, tmax = self.bundledomain
+        (amin, amax) = self.tandomain
+        tcurve = self.tangentCurve()
+        width = self.tanlw * self.dpi * scale / 72.0
+        ds = (amax - amin) / float(samples)
+        jitter = numpy.random.RandomState(0)
+        # a chunk of tangents at a time, of at most raster.chunksize points
+        chunk = max(1, raster.chunksize // samples)
+        for c0 in range(0, n, chunk):
+            t = tmin + numpy.arange(c0, min(n, c0+chunk)) * ((tmax - tmin) / float(n or 1))
+            coeffs = tcurve.taylorCoefficients(t, self.degree)
+            colors = numpy.asarray(self.tangentColors(t, tcurve), dtype=numpy.float64)
+            colors = numpy.broadcast_to(colors.reshape(-1, 4), (len(t), 4))
+            s = amin + ds * (numpy.arange(samples) + jitter.random_sample((len(t), samples)))
+            points = curve.hornerVertices(coeffs, s)
+            # the length in pixels of the piece of tangent around each point
+            if self.degree > 0:
+                dcoeffs = coeffs[:,1:] * numpy.arange(1, self.degree+1)[:,numpy.newaxis]
+                speed = curve.hornerVertices(dcoeffs, s) * self.pixelScale(figsize)
+                area = numpy.sqrt((speed**2).sum(axis=-1)) * ds * width
+            else:
+                area = numpy.zeros(s.shape)
+            acc.addPoints(points, colors, area, self.tanalpha, 1.0/self.n_part)
+        img = acc.image(self.facecolor)
+        if self.showcurve:
+            img = raster.over(self.drawCurveLayer(fig), img)
+        if save:
+            filename = self.filename
+            if not type(filename) == str:
+                filename = misc.datetimeFilename(pre="taylorbundle_render_")
+            matplotlib.image.imsave("{}_preview{}.png".format(filename, scale), img)
+        return img
+
+    @misc.timed(False)
+    def renderDegrees(self, degrees, sheet=False, columns=None):
+        """ render the image at each of the `degrees`, saved as
+            `<filename>_degree<k>.png`, or with `sheet` side by side on one
+            contact sheet `<filename>_degrees.png`, `columns` wide. Each
+            partial's Taylor coefficients are computed once, up to the
+            highest degree, and truncated for the lower ones. With the
+            tangents on fixed offsets (no `clip` nor `tanerror`) each
+            degree's vertices are those of the degree before plus a term.
+            The buffers of all degrees are in memory at once, and with
+            `hdr` saved as `<filename>_degree<k>.npy`. The partials are
+            rendered in this process, untiled and without symmetry: with
+            `workers`, `symmetry` or a tiled image size it raises
+            ValueError. Returns the images, as rgba arrays of floats, by
+            increasing degree. """
+        degrees = sorted(set(degrees))
+        filename, figsize, n_tan = self.filename, self.figsize, self.n_tan
+        if not type(filename) == str:
+            filename = misc.datetimeFilename(pre="taylorbundle_render_")
+        fig = self.initializeFigure(figsize)
+        ds = self.partialOffsets(n_tan, self.n_part)
+        self.checkBackend()
+        (w, h) = fig.canvas.get_width_height()
+        if self.workers > 1 or self.symmetry:
+            raise ValueError("renderDegrees needs workers=1 and no symmetry")
+        if self.max_tile_pixels is not None and w*h > self.max_tile_pixels:
+            raise ValueError("renderDegrees doesn't tile, the image is larger than max_tile_pixels")
+        bundles = []
+        for k in degrees:
+            bundles.append(copy.copy(self))
+            bundles[-1].set_options(degree=k)
+        top = bundles[-1]
+        tcurve = self.tangentCurve()
+        tmin, tmax = self.bundledomain
+        totals = [ numpy.zeros((h, w, 4)) for k in degrees ]
+        buf = numpy.empty((h, w, 4))
+        chunked = any(b.chunkSize(n_tan, figsize) < n_tan for b in bundles)
+        fixed = not (self.clip or chunked) and self.tanerror is None
+        if fixed:
+            (amin, amax) = self.tandomain
+            vander = curve.vandermonde(numpy.linspace(amin, amax, self.tanres), degrees[-1])
+            if self.float32:
+                vander = vander.astype(numpy.float32)
+        for i, d in enumerate(ds):
+            (coeffs, colors) = top.tangentCoefficients(tmin+d, tmax+d, n_tan, tcurve)
+            if fixed:
+                sweep = curve.taylorVertexSweep(coeffs.astype(vander.dtype), vander, degrees)
+                for bundle, total, vertices in zip(bundles, totals, sweep):
+                    bundle.drawPartial(fig, buf, [(vertices, colors)], len(ds))
+                    total += buf
+            else:
+                for bundle, total, k in zip(bundles, totals, degrees):
+                    bundle.renderPartial( fig, ds, i, n_tan, tcurve, figsize, buf
+                                        , tangents=(coeffs[:,:k+1], colors) )
+                    total += buf
+        images = []
+        for k, total in zip(degrees, totals):
+            if self.hdr:
+                numpy.save("{}_degree{}.npy".format(filename, k), total)
+            images.append(self.composite(fig, total, len(ds)))
+            if not sheet:
+                matplotlib.image.imsave("{}_degree{}.png".format(filename, k), images[-1])
+        if sheet:
+            matplotlib.image.imsave( "{}_degrees.png".format(filename)
+                                   , image.contactSheet(images, columns, max(1, h//50)) )
+        return images
+
+    def partialOffsets(self, n_tan, n_part):
+        """ the offsets of the partials' points of tangency """
+        tmin, tmax = self.bundledomain
         # div by zero quick fix: set dt to an arbitrary value if zero n_tan
         if n_tan == 0: dt = 1
         else: dt = float(tmax-tmin)/n_tan
-        ds = numpy.linspace(0, dt, n_part, False)
-        partial_filenames = []
-        for i, d in enumerate(ds):
-            ax = self.initializeAxes()  # clear the current axes
-            self.drawTangents(ax, tmin+d, tmax+d, n_tan)
-            # plot the curve
-            if self.showcurve:
-                self.drawCurve(ax)
+        return numpy.linspace(0, dt, n_part, False)
+
+    def renderBundle(self, fig, filename, figsize, ds, n_tan):
+        """ the sum of the buffers of the partials, the tangent bundle's
+            layer of the image """
+        def renderPartials():
+            group = self.symmetryGroup(len(ds) * n_tan)
+            if len(group) > 1:
+                total = self.renderSymmetric(fig, figsize, len(ds), n_tan, group)
+            elif self.workers > 1:
+                total = self.renderParallel(fig, filename, figsize, ds, n_tan)
+            else:
+                total = self.renderSerial(fig, filename, figsize, ds, n_tan)
+            return {"total": total}
+        if self.keep_partials and filename is not None:
+            # the partial files are only written when they are rendered
+            return renderPartials()["total"]
+        return self.cached("partials", (figsize, ds, n_tan), renderPartials)["total"]
+
+    # The options each stage of the tangent bundle depends on, in addition
+    # to those of the stages before it. The sum of the partials is the
+    # bundle's layer of the image.
+    cacheStages = [ ("coefficients", ["curve", "degree", "arclength", "bundledomain", "tancol"])
+                  , ("polylines", [ "tandomain", "tanres", "tanerror", "clip", "window", "dpi", "tanlw"
+                                  , "float32" ])
+                  , ("partials", ["n_part", "tanalpha", "backend", "tanfilter", "symmetry"])
+                  ]
+    # The options of the other layers. The background is just `facecolor`,
+    # which the partials of the matplotlib backend also depend on.
+    cacheLayers = { "curve": [ "curve", "curvedomain", "curveres", "curvecol"
+                             , "curvelw", "curvealpha", "window", "dpi" ]
+                  }
+    def cacheKey(self, stage, *args):
+        """ the fingerprint of everything the result of `stage` with the
+            arguments `args` depends on """
+        values = []
+        if stage in self.cacheLayers:
+            values.extend((o, getattr(self, o)) for o in self.cacheLayers[stage])
+        else:
+            for name, options in self.cacheStages:
+                values.extend((o, getattr(self, o)) for o in options)
+                if name == stage:
+                    break
+            if stage == "partials" and self.backend == "matplotlib":
+                values.append(("facecolor", self.facecolor))
+        code = [ type(self), curve.taylorPolylines, curve.visibleIntervals
+               , curve.taylorSegments, curve.restrictPieces, raster.Accumulator ]
+        return cache.fingerprint(stage, args, values, code)
+    def cached(self, stage, args, compute):
+        """ the dict of arrays `compute()`, from the cache if it is there,
+            for the stage of rendering `stage` with arguments `args`. With
+            `keep_layers` the last layer of each kind is also kept in
+            memory. """
+        memory = self._layers if self.keep_layers and stage in self.layerStages else None
+        if self.cache is None and memory is None:
+            return compute()
+        key = self.cacheKey(stage, *args)
+        if memory is not None and stage in memory and memory[stage][0] == key:
+            return memory[stage][1]
+        arrays = None
+        if self.cache is not None:
+            store = cache.Cache(self.cache, self.cache_size)
+            arrays = store.get(key)
+        if arrays is None:
+            arrays = compute()
+            if self.cache is not None:
+                store.put(key, arrays)
+        if memory is not None:
+            memory[stage] = (key, arrays)
+        return arrays
+    layerStages = ("partials", "curve")
+
+    def checkBackend(self):
+        if self.backend not in ("matplotlib", "native"):
+            raise ValueError('unknown backend "{}"'.format(self.backend))
+        # matplotlib's partials are 8 bit images already
+        if self.hdr and self.backend != "native":
+            raise ValueError("hdr needs the native backend")
+
+    def renderSerial(self, fig, filename, figsize, ds, n_tan):
+        """ render the partials one after another, each into a buffer in
+            memory, and return their sum. """
+        (w, h) = fig.canvas.get_width_height()
+        total = numpy.zeros((h, w, 4))
+        buf = numpy.empty((h, w, 4))
+        tcurve = self.tangentCurve()
+        for i in range(len(ds)):
+            self.renderPartial(fig, ds, i, n_tan, tcurve, figsize, buf)
+            self.savePartial(fig, filename, i, buf)
+            total += buf
+        return total
+
+    def renderPartial( self, fig, ds, i, n_tan, tcurve, figsize, out
+                     , window=None, tangents=None ):
+        """ render partial i into the array `out`, of shape (h, w, 4): the
+            accumulation buffer of the native backend, or the rgba image
+            of the matplotlib backend. With `window` only that part of the
+            image is rendered, into a figure of its size. """
+        tmin, tmax = self.bundledomain
+        d = ds[i]
+        chunks = self.tangentChunks(tmin+d, tmax+d, n_tan, tcurve, figsize, window, tangents)
+        self.drawPartial( fig, out, chunks, len(ds), window
+                        , self.chunkSize(n_tan, figsize) < n_tan )
+
+    def drawPartial(self, fig, out, chunks, n_part, window=None, chunked=False):
+        """ draw the polylines and colours of `chunks` into the buffer
+            `out` of a partial, one of n_part. With `chunked` matplotlib
+            draws the chunks on the canvas one at a time. """
+        if self.backend == "native":
+            (h, w) = out.shape[:2]
+            out[...] = 0
+            acc = raster.Accumulator( (h, w), self.window if window is None else window
+                                    , self.tanfilter, out )
+            width = self.tanlw * self.dpi / 72.0
+            for taylorcoords, colors in chunks:
+                # each partial counts as 1/n_part of the image, as in the
+                # average of the matplotlib partials
+                acc.addPolylines( taylorcoords, colors, width
+                                , self.tanalpha, 1.0/n_part )
+        else:
+            ax = self.initializeAxes(window)
+            # the tangents over the background, without the curve. Agg's 8
+            # bit blending onto a transparent canvas is too coarse to
+            # composite the background later.
+            fig.patch.set_facecolor(self.facecolor)
+            if chunked:
+                # the chunks are drawn over the background one at a time
+                fig.canvas.draw()
+            self.drawPolylines(ax, chunks, chunked)
+            out[...] = self.canvasImage(fig, draw=not chunked)
+
+    def savePartial(self, fig, filename, i, buf):
+        """ save the image of partial i, if `keep_partials` is set """
+        if self.keep_partials and self.backend == "matplotlib" and filename is not None:
             pfname = "{}_partial{}.png".format(filename, i)
-            fig.savefig(pfname, dpi = self.dpi, facecolor = self.facecolor)
-            partial_filenames.append(pfname)
-        # compose partials and delete partial files
-        image.composeAverage(filename+".png", partial_filenames)
-        if not self.keep_partials:
-            for fn in partial_filenames:
-                misc.deleteFile(fn)
+            matplotlib.image.imsave(pfname, self.composite(fig, buf, 1))
+
+    def saveComposite(self, fig, filename, total, n_part):
+        """ save the sum `total` of the buffers of n_part partials, and
+            with `hdr` the buffer itself """
+        if self.hdr:
+            numpy.save(filename+".npy", total)
+        matplotlib.image.imsave(filename+".png", self.composite(fig, total, n_part))
+
+    def composite(self, fig, total, n_part, window=None):
+        """ the image of the sum `total` of the buffers of n_part partials,
+            as an rgba array of floats: the layers of the background, the
+            tangent bundle and the generating curve, one over the other.
+            The partials of the matplotlib backend have the background
+            already. """
+        (h, w) = total.shape[:2]
+        if self.backend == "native":
+            acc = raster.Accumulator( (h, w), self.window if window is None else window
+                                    , buffer=total )
+            img = acc.image(self.facecolor)
+        else:
+            # the background is drawn into matplotlib's partials
+            img = total / n_part
+        if self.showcurve:
+            img = raster.over(self.curveLayer(fig, window), img)
+        return img
+
+    def renderParallel(self, fig, filename, figsize, ds, n_tan):
+        """ render the partials in a pool of `workers` processes. The
+            workers write their buffers into shared memory slots, which are
+            summed in the order of the partials, so that the sum doesn't
+            depend on the number of workers. """
+        (w, h) = fig.canvas.get_width_height()
+        n = len(ds)
+        nslots = min(n, 2*self.workers)
+        shared = multiprocessing.RawArray("d", nslots*h*w*4)
+        slots = numpy.frombuffer(shared).reshape(nslots, h, w, 4)
+        pool = multiprocessing.Pool( self.workers, _initWorker
+                                   , (self, figsize, ds, n_tan, filename, shared) )
+        total = numpy.zeros((h, w, 4))
+        try:
+            jobs = {}
+            for i in range(nslots):
+                jobs[i] = pool.apply_async(_renderJob, (i, i))
+            for i in range(n):
+                jobs.pop(i).get()
+                total += slots[i % nslots]
+                # the slot is free again
+                if i + nslots < n:
+                    jobs[i+nslots] = pool.apply_async(
+                        _renderJob, (i+nslots, i % nslots) )
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+        return total
+
+    # The symmetries of the image's pixel grid: the mirror images in the
+    # vertical and the horizontal line through the centre of the window,
+    # and the half turn about it. As (matrix, flip of the image's rows
+    # and columns).
+    gridSymmetries = { "mirrorx": ([[-1, 0], [0, 1]], (slice(None), slice(None, None, -1)))
+                     , "mirrory": ([[1, 0], [0, -1]], (slice(None, None, -1), slice(None)))
+                     , "halfturn": ([[-1, 0], [0, -1]], (slice(None, None, -1), slice(None, None, -1)))
+                     }
+
+    def symmetryGroup(self, n):
+        """ the symmetries of the bundle of n tangents (of all partials)
+            that map the image's pixel grid onto itself, and which
+            `render` makes use of with `symmetry`: a list of (name, index
+            map) of the identity and the symmetries found among
+            `gridSymmetries` (or those named by `symmetry`). The index map
+            is the permutation of the grid of tangents, which are mapped
+            onto each other with their colours. Only the native backend
+            in one process uses the symmetries. """
+        identity = [(None, numpy.arange(n))]
+        if not self.symmetry or self.backend != "native" or self.workers > 1 or n == 0:
+            return identity
+        names = sorted(self.gridSymmetries) if self.symmetry is True else self.symmetry
+        found = dict( (name, self.symmetryMap(name, n)) for name in names )
+        found = dict((name, perm) for name, perm in found.items() if perm is not None)
+        # the group of two mirrors and the half turn, or of one of them
+        if "mirrorx" in found and "mirrory" in found:
+            (px, py) = (found["mirrorx"], found["mirrory"])
+            if (px[py] == py[px]).all():
+                return identity + [("mirrorx", px), ("mirrory", py), ("halfturn", px[py])]
+        for name in ("mirrorx", "mirrory", "halfturn"):
+            if name in found:
+                return identity + [(name, found[name])]
+        return identity
+
+    def symmetryMap(self, name, n):
+        """ the permutation of the grid of n tangents by the symmetry
+            `name` of `gridSymmetries`, or None if the tangents aren't
+            symmetric. The points of tangency map to those a number of
+            steps on, or back, along the grid, and the tangents' Taylor
+            coefficients and colours with them. """
+        (m, flip) = self.gridSymmetries[name]
+        m = numpy.array(m, dtype=numpy.float64)
+        (xmin, xmax, ymin, ymax) = self.window
+        centre = numpy.array([xmin+xmax, ymin+ymax]) / 2.0
+        def mapped(xy):
+            return (xy - centre).dot(m.T) + centre
+        tmin, tmax = self.bundledomain
+        tcurve = self.tangentCurve()
+        t = numpy.linspace(tmin, tmax, n, False)
+        points = tcurve(t)
+        size = abs(points).max() + abs(centre).max() + 1
+        tolerance = 1e-9 * size
+        image = mapped(points)
+        # the steps to where the first point maps to, forwards or back
+        candidates = numpy.flatnonzero(abs(points - image[0]).max(axis=1) <= tolerance)
+        index = numpy.arange(n)
+        coeffs = colors = None
+        for j in candidates:
+            for sign in (1, -1):
+                perm = (j + sign*index) % n
+                if sign == 1 and j == 0:
+                    continue
+                if (perm[perm] != index).any():
+                    continue
+                if abs(points[perm] - image).max() > tolerance:
+                    continue
+                # the tangents map onto each other, the direction of the
+                # offsets reversed by a reversed parameter. All of them
+                # are compared, with their colours.
+                if coeffs is None:
+                    coeffs = tcurve.gridTaylorCoefficients(tmin, tmax, n, self.degree)
+                    colors = colorConverter.to_rgba_array(self.tangentColors(t, tcurve))
+                    colors = numpy.broadcast_to(colors, (n, 4))
+                a = coeffs.dot(m.T) * (float(sign) ** numpy.arange(self.degree+1))[:,numpy.newaxis]
+                a[:,0] += centre - centre.dot(m.T)
+                b = coeffs[perm]
+                if abs(a - b).max() > 1e-7 * (size + abs(b).max()):
+                    continue
+                if abs(colors - colors[perm]).max() > 1e-9:
+                    continue
+                return perm
+        return None
+
+    def renderSymmetric(self, fig, figsize, n_part, n_tan, group):
+        """ the sum of the buffers of the partials of a symmetric bundle:
+            the tangents of one of each orbit under the `group` of
+            `symmetryGroup`, weighted by the size of their orbit, and
+            their buffer mapped by each symmetry """
+        (w, h) = fig.canvas.get_width_height()
+        n = n_part * n_tan
+        images = numpy.array([perm for name, perm in group])
+        first = numpy.flatnonzero(images.min(axis=0) == numpy.arange(n))
+        ordered = numpy.sort(images[:,first], axis=0)
+        orbit = 1 + (ordered[1:] != ordered[:-1]).sum(axis=0)
+        tmin, tmax = self.bundledomain
+        tcurve = self.tangentCurve()
+        buf = numpy.zeros((h, w, 4))
+        acc = raster.Accumulator((h, w), self.window, self.tanfilter, buf)
+        width = self.tanlw * self.dpi / 72.0
+        chunk = self.chunkSize(n_tan, figsize)
+        for size in numpy.unique(orbit):
+            index = first[orbit == size]
+            # each partial counts as 1/n_part of the image
+            weight = size / float(len(group) * n_part)
+            for c0 in range(0, len(index), chunk):
+                t = tmin + index[c0:c0+chunk] * ((tmax - tmin) / float(n))
+                part = (tcurve.taylorCoefficients(t, self.degree), self.tangentColors(t, tcurve))
+                taylorcoords, colors = self.tangentPolylines(
+                    tmin, tmax, n, tcurve, figsize, tangents=part )
+                acc.addPolylines(taylorcoords, colors, width, self.tanalpha, weight)
+        total = buf.copy()
+        for name, perm in group[1:]:
+            total += buf[self.gridSymmetries[name][1]]
+        return total
+
+    def tileSize(self, w, h):
+        """ width and height of the tiles of an image of w x h pixels: whole
+            rows if they fit in max_tile_pixels, otherwise squares """
+        if w <= self.max_tile_pixels:
+            return (w, max(1, self.max_tile_pixels // w))
+        side = max(1, int(numpy.sqrt(self.max_tile_pixels)))
+        return (side, side)
+
+    def tileApron(self):
+        """ the margin of the tiles, in pixels. matplotlib antialiases
+            lines differently where they leave the figure, so tiles with
+            anything drawn by it get a margin. The native rasterizer's
+            tiles join exactly. """
+        if self.backend == "matplotlib" or self.showcurve:
+            return int(numpy.ceil(max(self.tanlw, self.curvelw) * self.dpi / 72.0)) + 2
+        return 0
+
+    def renderTiled(self, fig, filename, figsize, ds, n_tan):
+        """ render the image in tiles of at most max_tile_pixels, and
+            stream it to the file a row of tiles at a time. Each tile gets
+            only the tangents whose bounding boxes meet it (widened by the
+            line width), and tiles that nothing touches are just filled
+            with the background. """
+        (w, h) = fig.canvas.get_width_height()
+        (tw, th) = self.tileSize(w, h)
+        (xmin, xmax, ymin, ymax) = self.window
+        (sx, sy) = (float(xmax-xmin)/w, float(ymax-ymin)/h)
+        (amin, amax) = self.tandomain
+        tcurve = self.tangentCurve()
+        # the tangents of each partial with their bounding boxes, cached
+        # if they take less memory than a tile's buffers
+        size = len(ds) * n_tan * (self.degree+1) * 2 * 8 * 2
+        cache = {} if size <= self.max_tile_pixels * 4 * 8 else None
+        def partialTangents(i):
+            if cache is not None and i in cache:
+                return cache[i]
+            tmin, tmax = self.bundledomain
+            coeffs, colors = self.tangentCoefficients(tmin+ds[i], tmax+ds[i], n_tan, tcurve)
+            tangents = (coeffs, colors) + curve.taylorBounds(coeffs, amin, amax)
+            if cache is not None:
+                cache[i] = tangents
+            return tangents
+        curvebox = self.curveBounds()
+        apron = self.tileApron()
+        background = image.toBytes(numpy.array(colorConverter.to_rgba(self.facecolor)))
+        writer = image.PNGWriter(filename+".png", w, h)
+        if self.hdr:
+            # the buffer is written a tile at a time through a memory map
+            hdr = numpy.lib.format.open_memmap( filename+".npy", "w+"
+                                              , dtype=numpy.float64, shape=(h, w, 4) )
+        try:
+            for r0 in range(0, h, th):
+                r1 = min(h, r0+th)
+                band = numpy.empty((r1-r0, w, 4), dtype=numpy.uint8)
+                band[...] = background
+                for c0 in range(0, w, tw):
+                    c1 = min(w, c0+tw)
+                    # the tile with a margin of `apron` pixels, which is
+                    # cut off again
+                    (a0, a1) = (c0-apron, c1+apron)
+                    (b0, b1) = (r0-apron, r1+apron)
+                    window = (xmin + a0*sx, xmin + a1*sx, ymax - b1*sy, ymax - b0*sy)
+                    tile = self.renderTile(window, (b1-b0, a1-a0), figsize, ds, n_tan,
+                                           tcurve, partialTangents, curvebox)
+                    if tile is not None:
+                        (total, img) = tile
+                        inner = (slice(apron, apron+r1-r0), slice(apron, apron+c1-c0))
+                        band[:,c0:c1] = image.toBytes(img[inner])
+                        if self.hdr:
+                            hdr[r0:r1,c0:c1] = total[inner]
+                writer.write(band)
+        finally:
+            writer.close()
+            if self.hdr:
+                del hdr
+        # leave the figure as it was
+        self.initializeFigure(figsize)
+
+    def renderTile(self, window, shape, figsize, ds, n_tan, tcurve, partialTangents, curvebox):
+        """ the sum of the buffers of the partials of one tile and its
+            image, or None if nothing is drawn on it """
+        (cxmin, cxmax, cymin, cymax) = self.clipWindow(figsize, window)
+        def meets(lower, upper):
+            return ( (lower[...,0] <= cxmax) & (upper[...,0] >= cxmin)
+                     & (lower[...,1] <= cymax) & (upper[...,1] >= cymin) )
+        tangents = []
+        for i in range(len(ds)):
+            coeffs, colors, lower, upper = partialTangents(i)
+            index = numpy.flatnonzero(meets(lower, upper))
+            tangents.append((coeffs[index], colors[index]))
+        showcurve = self.showcurve and meets(*curvebox)
+        if not showcurve and not any(len(c) for c, colors in tangents):
+            return None
+        (th, tw) = shape
+        fig = self.initializeFigure(( numpy.nextafter(tw / float(self.dpi), numpy.inf)
+                                    , numpy.nextafter(th / float(self.dpi), numpy.inf) ))
+        total = numpy.zeros((th, tw, 4))
+        buf = numpy.empty((th, tw, 4))
+        # matplotlib simplifies paths depending on the part that is in the
+        # figure, which would show at the borders of the tiles
+        with matplotlib.rc_context({"path.simplify": False}):
+            for i in range(len(ds)):
+                self.renderPartial(fig, ds, i, n_tan, tcurve, figsize, buf, window, tangents[i])
+                total += buf
+            return total, self.composite(fig, total, len(ds), window)
+
+    def curveBounds(self):
+        """ bounding box of the generating curve, widened by its line width """
+        tmin, tmax = self.curvedomain
+        t = numpy.linspace(tmin, tmax, self.curveres)
+        xy = numpy.stack([self.curve.x(t), self.curve.y(t)], axis=-1)
+        margin = (self.curvelw * self.dpi / 72.0 / 2 + 1) / self.pixelScale()
+        return xy.min(axis=0) - margin, xy.max(axis=0) + margin
+
+    @misc.timed(False)
+    def renderProgressive(self, cadence=None, tolerance=1e-3, callback=None):
+        """ render the tangents of all partials in their low discrepancy
+            order, a pass of `cadence` tangents at a time (n_tan by
+            default), and stop early once an image changes by less than
+            `tolerance` from the one before: the relative L2 change of its
+            density with the native backend, or of the image with
+            matplotlib, whose passes are whole partials. After each pass
+            `callback(count, image, change)` is called, if given, with the
+            number of tangents drawn so far and the image as an rgba array.
+            The last image is saved to the file. Returns a list of (count,
+            change) per pass, change being None for the first. """
+        filename, figsize = self.filename, self.figsize
+        n_part, n_tan = self.n_part, self.n_tan
+        tmin, tmax = self.bundledomain
+        if not type(filename) == str:
+            filename = misc.datetimeFilename(pre="taylorbundle_render_")
+        self.checkBackend()
+        fig = self.initializeFigure(figsize)
+        (w, h) = fig.canvas.get_width_height()
+        total = numpy.zeros((h, w, 4))
+        tcurve = self.tangentCurve()
+        if self.backend == "native":
+            # the tangents of all partials make one grid, and the order of
+            # that grid draws an ever finer subset of it
+            n = n_part * n_tan
+            tangents = self.tangentCoefficients(tmin, tmax, n, tcurve)
+            counts = range(0, n, cadence or n_tan)[1:] + [n]
+            acc = raster.Accumulator((h, w), self.window, self.tanfilter, total)
+            width = self.tanlw * self.dpi / 72.0
+        else:
+            ds = self.partialOffsets(n_tan, n_part)
+            counts = [n_tan * (i+1) for i in range(n_part)]
+            buf = numpy.empty((h, w, 4))
+        history = []
+        previous = None
+        drawn = 0
+        for i, count in enumerate(counts):
+            if self.backend == "native":
+                coeffs, colors = tangents
+                part = (coeffs[drawn:count], colors[drawn:count])
+                taylorcoords, colors = self.tangentPolylines(
+                    tmin, tmax, n, tcurve, figsize, tangents=part )
+                acc.addPolylines( taylorcoords, colors, width
+                                , self.tanalpha, 1.0/n_part )
+                # the density of the tangents drawn so far, scaled to all
+                current = total * (n / float(count) if count else 1)
+                img = self.composite(fig, current, n_part)
+                metric = current[...,0]
+            else:
+                self.renderPartial(fig, ds, i, n_tan, tcurve, figsize, buf)
+                total += buf
+                img = metric = self.composite(fig, total, i+1)
+            change = None
+            if previous is not None:
+                norm = numpy.sqrt((metric**2).sum())
+                diff = numpy.sqrt(((metric - previous)**2).sum())
+                change = diff / norm if norm > 0 else 0.0
+            history.append((count, change))
+            if callback is not None:
+                callback(count, img, change)
+            previous = metric.copy()
+            drawn = count
+            if change is not None and change < tolerance:
+                break
+        if self.hdr:
+            numpy.save(filename+".npy", current)
+        matplotlib.image.imsave(filename+".png", img)
+        return history
+
+    def canvasImage(self, fig, draw=True):
+        """ the figure as drawn on its canvas, as an rgba array of floats.
+            Without `draw` the canvas is taken as it is. """
+        if draw:
+            fig.canvas.draw()
+        (w, h) = fig.canvas.get_width_height()
+        buf = numpy.frombuffer(fig.canvas.buffer_rgba(), dtype=numpy.uint8)
+        return buf.reshape(h, w, 4) / 255.0
+
+    def curveLayer(self, fig, window=None):
+        """ the generating curve on a transparent background, as an rgba
+            array of floats """
+        return self.cached( "curve", (fig.canvas.get_width_height(), window)
+                          , lambda: {"layer": self.drawCurveLayer(fig, window)} )["layer"]
+    def drawCurveLayer(self, fig, window=None):
+        """ `curveLayer`, drawn without the cache """
+        ax = self.initializeAxes(window)
+        self.drawCurve(ax)
+        fig.patch.set_alpha(0)
+        ax.patch.set_alpha(0)
+        layer = self.canvasImage(fig)
+        fig.patch.set_alpha(1)
+        return layer
 
     def renderTancolorLegend(self):
         tb = copy.copy(self)
@@ -191,3 +1143,43 @@ class TaylorBundle(object):
         else:
             tb.set_options( filename = misc.datetimeFilename("taylorbundle_tancolorLegend_") )
         tb.render()
+
+
+def _packPolylines(polylines, colors):
+    """ polylines and their colours as a dict of arrays, for the cache """
+    if isinstance(polylines, numpy.ndarray):
+        return {"polylines": polylines, "colors": colors}
+    counts = numpy.array([len(p) for p in polylines], dtype=int)
+    vertices = numpy.concatenate(polylines) if len(polylines) else numpy.zeros((0, 2))
+    return {"vertices": vertices, "counts": counts, "colors": colors}
+
+def _unpackPolylines(arrays):
+    if "polylines" in arrays:
+        return arrays["polylines"], arrays["colors"]
+    ends = numpy.cumsum(arrays["counts"])
+    polylines = [ arrays["vertices"][e-c:e] for c, e in zip(arrays["counts"], ends) ]
+    return polylines, arrays["colors"]
+
+
+################################################################################
+## Parallel rendering. The bundle and the shared memory are handed to the
+## pool's processes when they start, since neither can be pickled.
+
+_worker = {}
+
+def _initWorker(bundle, figsize, ds, n_tan, filename, shared):
+    fig = bundle.initializeFigure(figsize)
+    (w, h) = fig.canvas.get_width_height()
+    _worker.update( bundle = bundle, fig = fig, figsize = figsize, ds = ds
+                  , n_tan = n_tan, filename = filename
+                  , tcurve = bundle.tangentCurve()
+                  , slots = numpy.frombuffer(shared).reshape(-1, h, w, 4) )
+
+def _renderJob(i, slot):
+    """ render partial i into the shared memory slot """
+    bundle = _worker["bundle"]
+    out = _worker["slots"][slot]
+    bundle.renderPartial( _worker["fig"], _worker["ds"], i, _worker["n_tan"]
+                        , _worker["tcurve"], _worker["figsize"], out )
+    bundle.savePartial(_worker["fig"], _worker["filename"], i, out)
+    return i
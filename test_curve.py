@@ -1,5 +1,6 @@
 
 import curve as c
+import jet
 import numpy as np
 from tests import testAll
 tau = 2 * np.pi
@@ -25,6 +26,88 @@ def t_numDiff_sin5():
     expected = -1
     return verySmall(v-expected,  1e-8)
 
+
+################################################################################
+# numDerivatives tests
+def t_numDerivatives_sin():
+    a = np.linspace(-3, 3, 7)
+    d, err = c.numDerivatives(np.sin, a, 5)
+    d_ = np.array([c.sinprime(i)(a) for i in range(6)]).T
+    return d.shape == (7, 6) and verySmall(d-d_, 1e-12)
+def t_numDerivatives_errorEstimate():
+    a = np.linspace(-3, 3, 7)
+    d, err = c.numDerivatives(np.exp, a, 4, h=0.2, accuracy=2, richardson=False)
+    d_ = np.exp(a)[:,np.newaxis]
+    return (abs(d-d_) <= 2*err + 1e-12).all() and err[:,1:].max() > 0
+def t_numDerivatives_singleEvaluation():
+    calls = []
+    def f(t):
+        calls.append(t.shape)
+        return t*t
+    c.numDerivatives(f, np.arange(100.), 6)
+    return len(calls) == 1
+def t_curve_numericTaylorCoefficients():
+    circ = c.Circle(2, 3, 1)
+    numeric = c.Curve(circ.x, circ.y)
+    a = np.linspace(0, tau, 10)
+    cs = numeric.taylorCoefficients(a, 5)
+    cs_ = circ.taylorCoefficients(a, 5)
+    return verySmall(cs-cs_, 1e-6)
+
+################################################################################
+# jet tests
+def t_jet_expSin():
+    # d^k/dt^k e^t sin(t) = sqrt(2)^k e^t sin(t + k*tau/8)
+    a = np.linspace(-2, 2, 5)
+    cs = jet.taylorCoefficients(lambda t: np.exp(t)*np.sin(t), a, 6)
+    k = np.arange(7)
+    ds_ = np.sqrt(2)**k * np.exp(a[:,np.newaxis]) * np.sin(a[:,np.newaxis] + k*tau/8)
+    return cs.shape == (5, 7) and verySmall(cs*c.factorials(6) - ds_, 1e-26)
+def t_jet_quotientPower():
+    a = np.array([0.5, 1.0, 2.0])
+    cs = jet.taylorCoefficients(lambda t: 1/(1-t/4.0)**2 + 0*t, a, 4)
+    k = np.arange(5)
+    # 1/(1-u)**2 = sum (k+1) u**k, about t=a with u=(t-a)/(4-a)
+    b = 4.0 - a[:,np.newaxis]
+    cs_ = (k+1) * 16 / b**(k+2)
+    return verySmall(cs-cs_, 1e-26)
+def t_jet_constant():
+    cs = jet.taylorCoefficients(lambda t: 3.0, np.arange(4.), 2)
+    return (cs == [3, 0, 0]).all()
+def t_jet_unsupported():
+    try:
+        jet.taylorCoefficients(lambda t: np.full_like(t, 3.0), np.arange(4.), 2)
+    except TypeError:
+        return True
+    return False
+def t_curve_autodiffTaylorCoefficients():
+    def x(t): return np.cos(t) + np.cos(-3*t) / 3.0
+    def y(t): return np.sin(t) + np.sin(-3*t) / 3.0
+    asteroid = c.Curve(x, y)
+    a = np.linspace(0, tau, 50)
+    cs = asteroid.taylorCoefficients(a, 7)
+    cs_ = c.Trochoid(-4, 1./3, 0).taylorCoefficients(a, 7)
+    return verySmall(cs-cs_, 1e-28)
+def t_curve_autodiffFallback():
+    # hypot is not supported by jets; falls back to numeric derivatives
+    curv = c.Curve(lambda t: np.hypot(t, 1), lambda t: t)
+    a = np.linspace(-1, 1, 5)
+    ds = curv.derivatives(a, 2)
+    ds_ = np.array([np.sqrt(a*a+1), a/np.sqrt(a*a+1), (a*a+1)**-1.5]).T
+    return verySmall(ds[:,:,0]-ds_, 1e-12) and verySmall(ds[:,1:,1]-[1,0], 1e-20)
+def t_curve_autodiffPiecewise():
+    # comparisons can't be made on jets; falls back to numeric derivatives
+    curv = c.fromFunction(lambda t: t*t*(t > 0))
+    a = np.array([-1.0, 2.0])
+    ds = curv.derivatives(a, 2)[:,:,1]
+    return verySmall(ds - [[0, 0, 0], [4, 4, 2]], 1e-12)
+def t_curve_autodiffScalar():
+    # derivatives at a single number, of every order including 0
+    curv = c.Curve(np.sin, np.cos)
+    ds = [curv.dx(1.0, n) for n in range(3)] + [curv.dy(1, n) for n in range(3)]
+    ds_ = [np.sin(1), np.cos(1), -np.sin(1), np.cos(1), -np.sin(1), -np.cos(1)]
+    return verySmall(np.array(ds) - ds_, 1e-28) and np.ndim(ds[0]) == 0
+
 ################################################################################
 # pascal tests
 def t_pascal_0():
@@ -54,6 +137,78 @@ def t_taylorPoly_sin():
     v_ = [0, 5./6, 2./3, -3./2]
     return verySmall(v-v_)
 
+def t_taylorPoly_largeArgument():
+    # expanding about a point far from 0 should not lose precision
+    a = 4000*np.pi
+    p = c.taylorPoly(np.sin, a, n=8, df=lambda a, n: c.sinprime(n)(a))
+    v = p(a+1)
+    v_ = sum((-1)**k / float(c.factorial(2*k+1)) for k in range(4))
+    return verySmall(v-v_, 1e-20)
+
+################################################################################
+# taylorVertices tests
+def t_taylorVertices_values():
+    circ = c.Circle(2, 3, 1)
+    a = np.array([0.5, 2.0, 40.0])
+    s = np.linspace(-1, 1, 5)
+    cs = circ.taylorCoefficients(a, 4)
+    pts = c.taylorVertices(cs, c.vandermonde(s, 4))
+    pts_ = np.array([ circ.taylorCurve(ai, 4)(ai+s) for ai in a ])
+    return pts.shape == (3, 5, 2) and verySmall(pts-pts_, 1e-24)
+
+def t_taylorSegments_lines():
+    cs = c.Line(3, -2).taylorCoefficients(np.linspace(0, 1, 4), 1)
+    return (c.taylorSegments(cs, -2, 2, 0.1) == 1).all()
+def t_taylorPolylines_tolerance():
+    # the polylines are within the tolerance of finely sampled curves
+    cs = c.Epitrochoid(3, 1, 2).taylorCoefficients(np.linspace(0, tau, 7), 3)
+    segments = c.taylorSegments(cs, -2, 2, 0.01)
+    lines = c.taylorPolylines(cs, -2, 2, segments)
+    fine = c.taylorVertices(cs, c.vandermonde(np.linspace(-2, 2, 4097), 3))
+    ok = True
+    for v, f in zip(lines, fine):
+        # distance of each fine point to the chord of its segment
+        j = np.minimum((np.arange(4097) * (len(v)-1)) // 4096, len(v)-2)
+        p0, d = v[j], v[j+1] - v[j]
+        w = f - p0
+        dist = abs(w[:,0]*d[:,1] - w[:,1]*d[:,0]) / np.sqrt((d*d).sum(axis=1))
+        ok = ok and dist.max() <= 0.01
+    return ok and len(set(segments)) > 1
+
+def t_polyRoots():
+    p = np.array([[-1, 0, 1], [2, -3, 1], [1, 2, 0], [3, 0, 0], [0, 0, 0]], dtype=float)
+    roots = np.sort_complex(c.polyRoots(p))
+    roots_ = np.array([[-1, 1], [1, 2], [-0.5, np.nan], [np.nan]*2, [np.nan]*2])
+    return np.allclose(roots, roots_, equal_nan=True)
+def t_visibleIntervals():
+    # compare with the visibility of finely sampled curves
+    cs = c.Epitrochoid(3, 1, 2).taylorCoefficients(np.linspace(0, tau, 50, False), 5)
+    window = (-3, 3, -2, 2)
+    index, lo, hi = c.visibleIntervals(cs, -2, 2, window)
+    s = np.linspace(-2, 2, 4001)
+    v = c.taylorVertices(cs, c.vandermonde(s, 5))
+    inside = (abs(v[...,0]) <= 3) & (abs(v[...,1]) <= 2)
+    found = np.zeros(inside.shape, dtype=bool)
+    for i, l, h in zip(index, lo, hi):
+        found[i] |= (s >= l) & (s <= h)
+    return (found == inside).all() and len(set(index)) < 50
+def t_restrictPieces():
+    # the parts of the polylines in two halves of a window have the same
+    # vertices as the whole polylines, and cover them
+    cs = c.Epitrochoid(3, 1, 2).taylorCoefficients(np.linspace(0, tau, 20, False), 3)
+    lo, hi = np.full(20, -1.0), np.full(20, 1.5)
+    segments = np.arange(20) + 3
+    whole = c.taylorPolylines(cs, lo, hi, segments)
+    used = [set() for i in range(20)]
+    for window in [(-100, 0, -100, 100), (0, 100, -100, 100)]:
+        piece, first, count = c.restrictPieces(cs, lo, hi, segments, window)
+        parts = c.taylorPolylines(cs[piece], lo[piece], hi[piece], segments[piece], first, count)
+        for p, f, n, v in zip(piece, first, count, parts):
+            if not verySmall(v - whole[p][f:f+n+1]):
+                return False
+            used[p].update(range(f, f+n))
+    return all(u == set(range(n)) for u, n in zip(used, segments))
+
 ################################################################################
 # sinprime and cosprime tests
 def t_sinprime():
@@ -226,6 +381,93 @@ def t_curve_add_circ_circ_diff():
     dy_ = [5,-4,3,-4,5]
     return (verySmall(dx-dx_,1e-29) and verySmall(dy-dy_))
 
+################################################################################
+# Curve algebra tests
+def t_curve_sub():
+    c1 = c.Circle(1,1,0)
+    c2 = c.Circle(2,2,0)
+    c3 = c1-c2
+    t = np.linspace(0,tau,5)
+    ps = c3(t)
+    ps_ = np.array([[-1,2,-3,2,-1], [0,1,0,-1,0]]).T
+    return verySmall(ps-ps_)
+def t_curve_transforms():
+    epi = c.Epitrochoid(3,1,2,tau/2)
+    m = c.rotation(0.7)
+    curv = (2*epi.rotate(0.7, center=(1,2)) - (3,4)).scale(1, -1)
+    a = np.linspace(0, tau, 6)
+    ds_ = np.dot(epi.derivatives(a, 4), m.T)
+    ds_[:,0,:] += (1,2) - m.dot((1,2))
+    ds_ = 2*ds_
+    ds_[:,0,:] -= (3,4)
+    ds_[:,:,1] *= -1
+    return verySmall(curv.derivatives(a, 4) - ds_, 1e-26)
+def t_composite_flat():
+    c1, c2, c3 = c.Circle(1), c.Circle(2, 2), c.Line(1, 0)
+    curv = ((c1 + c2) + (c3 + c1)).rotate(1) + c.Point(1, 1)
+    return len(curv.terms) == 4 and all(type(ci) is not c.Composite
+                                         for m, ci in curv.terms)
+def t_composite_cancel():
+    troch = c.Trochoid(4, 0.8, 1)
+    ds = (troch - troch).derivatives(np.linspace(0, tau, 5), 3)
+    return (ds == 0).all()
+
+################################################################################
+# FourierCurve tests
+def t_fourier_values():
+    four = c.FourierCurve.fromCoefficients([1, 2j], [1, -2])
+    t = np.linspace(0, tau, 7)
+    z = np.exp(1j*t) + 2j*np.exp(-2j*t)
+    return verySmall(four(t) - np.stack([z.real, z.imag], axis=-1))
+def t_fourier_period():
+    return ( abs(c.FourierCurve([1, 1], [1.5, 2.5]).period - 2*tau) < 1e-12
+             and abs(c.Epitrochoid(3, 1, 2).period - tau) < 1e-12
+             and c.FourierCurve([1, 1], [1, np.sqrt(2)]).period is None )
+def t_fourier_sumCollapsed():
+    # sums of Fourier curves and points are one FourierCurve, also when
+    # transformed, and mixed sums stay composites
+    troch = c.Trochoid(-4, .3)
+    curv = c.Circle(1, 2).rotate(0.5) - c.Epitrochoid(3, 1, 2) + c.Point(1, 2)
+    a = np.linspace(0, tau, 6)
+    ds_ = ( np.dot(c.Circle(1, 2).derivatives(a, 3), c.rotation(0.5).T)
+            - c.Epitrochoid(3, 1, 2).derivatives(a, 3) )
+    ds_[:,0] += (1, 2)
+    return ( isinstance(troch, c.FourierCurve) and troch.period == 2*np.pi
+             and list(troch.coefficients) == [1, 0.3]
+             and isinstance(curv, c.FourierCurve) and curv.period == tau
+             and verySmall(curv.derivatives(a, 3) - ds_, 1e-26)
+             and isinstance(troch + c.Line(1, 0), c.Composite) )
+def t_fourier_transformed():
+    epi = c.Epitrochoid(3, 1, 2, 1)
+    m = np.dot(c.rotation(0.4), [[1, 0], [0, -2]])
+    a = np.linspace(0, tau, 6)
+    ds_ = np.dot(epi.derivatives(a, 3), m.T)
+    return verySmall(epi.transformed(m).derivatives(a, 3) - ds_, 1e-24)
+def t_fourier_gridDerivatives():
+    curv = sum(c.Circle(1.0/k, k, k) for k in range(1, 21)).rotate(1) + c.Line(1, 2)
+    ds = curv.gridDerivatives(1, 1+tau, 50, 2)
+    ds_ = curv.derivatives(np.linspace(1, 1+tau, 50, False), 2)
+    return curv._fourier.fftGrid(1, 1+tau, 50) and verySmall(ds - ds_, 1e-24)
+
+################################################################################
+# ArcLengthCurve tests
+def t_arcLength_circle():
+    # a circle with varying angular velocity, reparametrized
+    circ = c.Curve(lambda t: 2*np.cos(t + np.sin(t)/2), lambda t: 2*np.sin(t + np.sin(t)/2))
+    al = c.ArcLengthCurve(circ)
+    u = np.linspace(0, tau, 9)
+    ds_ = c.Circle(2).derivatives(u, 4)
+    return ( abs(al.length - 2*tau) < 1e-9
+             and verySmall(al.derivatives(u, 4) - ds_, 1e-20) )
+def t_arcLength_parameterAt():
+    al = c.ArcLengthCurve(c.Epitrochoid(3, 1, 2, 0.5), res=512)
+    u = np.linspace(0, tau, 21)
+    t = al.parameterAt(u)
+    s = np.array([ np.sum(al._length(np.linspace(0, ti, 65)[:-1], np.linspace(0, ti, 65)[1:]))
+                   for ti in t ])
+    return ( verySmall(s - u*al.speed, 1e-16)
+             and verySmall(al.parameterAt(u+tau) - t - tau, 1e-24) )
+
 ################################################################################
 # Epitrochoid tests
 def t_epitrochoid_values():
@@ -305,6 +547,42 @@ def t_lissajous_taylor_curve():
     pts_ = poly_(t)
     return verySmall(pts-pts_, 1e-27)
 
+################################################################################
+# Batched Taylor coefficient tests
+def taylorCoefficients_helper(curv, n=3):
+    """ compare the batched coefficients with per-point dx, dy calls. """
+    a = np.linspace(-2, 5, 7)
+    cs = curv.taylorCoefficients(a, n)
+    cs_ = np.ndarray((7, n+1, 2))
+    for i in range(n+1):
+        cs_[:,i,0] = curv.dx(a, i) / c.factorial(i)
+        cs_[:,i,1] = curv.dy(a, i) / c.factorial(i)
+    return cs.shape == (7, n+1, 2) and verySmall(cs-cs_, 1e-28)
+def t_taylorCoefficients_point():
+    return taylorCoefficients_helper(c.Point(3, 5))
+def t_taylorCoefficients_line():
+    return taylorCoefficients_helper(c.Line(2, 6))
+def t_taylorCoefficients_circle():
+    return taylorCoefficients_helper(c.Circle(5, 2, tau/4), n=6)
+def t_taylorCoefficients_epitrochoid():
+    return taylorCoefficients_helper(c.Epitrochoid(3, 1, 2, tau/2), n=5)
+def t_taylorCoefficients_hypotrochoid():
+    return taylorCoefficients_helper(c.Hypotrochoid(3, 1, 2, tau/2), n=5)
+def t_taylorCoefficients_lissajous():
+    return taylorCoefficients_helper(c.Lissajous(3, 4, 4, 3, tau/12), n=5)
+def t_taylorCoefficients_sum():
+    return taylorCoefficients_helper(c.Line(1, 0) + c.Circle(1, -1, -tau/4))
+def t_taylorCoefficients_taylorCurve():
+    circ = c.Circle(2, 3, 1)
+    a = np.array([0.5, 2.0])
+    cs = circ.taylorCoefficients(a, 3)
+    s = np.linspace(-1, 1, 5)
+    pts = np.array([ [ np.polynomial.polynomial.polyval(s, cs[i,:,j])
+                       for j in range(2) ]
+                     for i in range(2) ]).transpose(0,2,1)
+    pts_ = np.array([ circ.taylorCurve(ai, 3)(ai+s) for ai in a ])
+    return verySmall(pts-pts_, 1e-24)
+
 ################################################################################
 # all tests
 all_tests = [ value
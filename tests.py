@@ -1,5 +1,7 @@
 import traceback
 import sys
+import os
+import subprocess
 
 import taylorbundle as tb
 import taylorbundle
@@ -7,8 +9,16 @@ import curve
 import colormix
 from colormix import normalize, smoothstep, cosine, gaussian
 import misc
+import raster
+import image
+import cache
+import animation
+import batch
+import io
+import json
 
 import numpy
+import matplotlib.pyplot
 
 
 ################################################################################
@@ -177,6 +187,13 @@ def misc_permute_rightOrder():
     b = (r==s).all()
     return b
 
+# cache - fingerprints of equal curves and colour functions are equal, and
+# differ when a constant in them does
+def misc_fingerprint_values():
+    def f(a): return curve.Trochoid(-4, a, 0), colormix.mix2("r", "b", cosine(0, a))
+    return ( cache.fingerprint(f(0.5)) == cache.fingerprint(f(0.5))
+             and cache.fingerprint(f(0.5)) != cache.fingerprint(f(0.25)) )
+
 ###############################################################################
 ##  Renderer Tests: These will signal success as long as the renderer doesn't
 ##  crash. The correctness of the resulting image must be inspectedf manually.
@@ -602,8 +619,507 @@ def cm_oob_wideViridisBand():
     bundle.render()
     return True
 
+# draw the bundle with the native rasterizer
+def tb_nativeBackend():
+    bundle = tb.TaylorBundle(
+          filename = "test/tb_nativeBackend"
+        , curve = curve.Trochoid(-5, 0.6, 0)
+        , backend = "native"
+        , n_tan = 300
+        , n_part = 2
+        , degree = 2
+        , tanlw = 2
+        , tanalpha = 0.3
+        , tancol = colormix.mix2("b", "r", cosine(0, tb.tau/2))
+        , dpi = 30
+        , window = [-4,4,-2.25,2.25]
+        )
+    bundle.render()
+    return True
+
+# rendering in parallel gives the same image as rendering serially
+def tb_parallelNativeRender():
+    images = []
+    for workers in (1, 3):
+        bundle = tb.TaylorBundle(
+              filename = "test/tb_parallelNativeRender{}".format(workers)
+            , curve = curve.Trochoid(-5, 0.6, 0)
+            , backend = "native"
+            , workers = workers
+            , n_tan = 100
+            , n_part = 4
+            , tanalpha = 0.3
+            , dpi = 30
+            , window = [-4,4,-2.25,2.25]
+            )
+        bundle.render()
+        images.append(matplotlib.pyplot.imread(bundle.filename + ".png"))
+    return (images[0] == images[1]).all()
+# matplotlib partials in parallel
+def tb_parallelMatplotlibRender():
+    bundle = tb.TaylorBundle(
+          filename = "test/tb_parallelMatplotlibRender"
+        , curve = curve.Trochoid(-5, 0.6, 0)
+        , workers = 2
+        , n_tan = 100
+        , n_part = 3
+        , tanalpha = 0.3
+        , dpi = 30
+        , window = [-4,4,-2.25,2.25]
+        )
+    bundle.render()
+    return True
+
+# partial files are only written with keep_partials
+def tb_keepPartials():
+    exists = []
+    for keep in (False, True):
+        name = "test/tb_keepPartials{}".format(keep)
+        bundle = tb.TaylorBundle(
+              filename = name
+            , curve = curve.Trochoid(-5, 0.6, 0)
+            , keep_partials = keep
+            , n_tan = 50
+            , n_part = 2
+            , dpi = 30
+            , window = [-4,4,-2.25,2.25]
+            )
+        bundle.render()
+        exists.append([ os.path.exists("{}_partial{}.png".format(name, i))
+                        for i in range(2) ])
+    return exists == [[False, False], [True, True]]
+
+# tiles of the native backend join exactly
+def tb_tiledNativeRender():
+    images = []
+    for tiles in (None, 500):
+        bundle = tb.TaylorBundle(
+              filename = "test/tb_tiledNativeRender{}".format(tiles)
+            , curve = curve.Trochoid(-5, 0.6, 0)
+            , backend = "native"
+            , max_tile_pixels = tiles
+            , showcurve = False
+            , n_tan = 100
+            , n_part = 2
+            , tanalpha = 0.3
+            , dpi = 30
+            , window = [-4,4,-2.25,2.25]
+            )
+        bundle.render()
+        images.append(matplotlib.pyplot.imread(bundle.filename + ".png"))
+    return (images[0] == images[1]).all()
+
+# progressive rendering stops early once converged, and without stopping
+# ends with the image of render()
+def tb_progressiveRender():
+    options = dict( curve = curve.Trochoid(-5, 0.6, 0)
+                  , backend = "native"
+                  , showcurve = False
+                  , n_tan = 100
+                  , n_part = 4
+                  , tanalpha = 0.3
+                  , dpi = 30
+                  , window = [-4,4,-2.25,2.25]
+                  )
+    bundle = tb.TaylorBundle(filename = "test/tb_progressiveRender", **options)
+    history = bundle.renderProgressive(cadence=50, tolerance=0)
+    full = matplotlib.pyplot.imread(bundle.filename + ".png")
+    bundle.render()
+    image = matplotlib.pyplot.imread(bundle.filename + ".png")
+    stopped = bundle.renderProgressive(cadence=50, tolerance=0.5)
+    return ( [count for count, change in history] == range(50, 401, 50)
+             and abs(full - image).max() <= 1/255.0
+             and len(stopped) < len(history)
+             and stopped[-1][1] < 0.5 )
+
+# the saved density buffer gives the rendered image again, also in tiles,
+# and can be tone mapped otherwise
+def tb_hdrBuffer():
+    buffers = []
+    for tiles in (None, 500):
+        bundle = tb.TaylorBundle(
+              filename = "test/tb_hdrBuffer{}".format(tiles)
+            , curve = curve.Trochoid(-5, 0.6, 0)
+            , backend = "native"
+            , hdr = True
+            , max_tile_pixels = tiles
+            , showcurve = False
+            , n_tan = 100
+            , n_part = 2
+            , tanalpha = 0.3
+            , dpi = 30
+            , window = [-4,4,-2.25,2.25]
+            )
+        bundle.render()
+        buffers.append(numpy.load(bundle.filename + ".npy", mmap_mode="r"))
+    rendered = matplotlib.pyplot.imread(bundle.filename + ".png")
+    img = image.tonemap(buffers[0])
+    brighter = image.tonemap(buffers[0], exposure=2)
+    mapped = [ image.tonemap(buffers[0], op) for op in image.tonemaps ]
+    return ( numpy.allclose(buffers[0], buffers[1], rtol=0, atol=1e-9)
+             and abs(img - rendered).max() <= 1/255.0
+             and (brighter[...,0] >= img[...,0]).all()
+             and all(((m >= 0) & (m <= 1)).all() for m in mapped) )
+
+# a render from the cache is the same, and only the changed stages are
+# added to it
+def tb_renderCache():
+    def entries():
+        return set(os.listdir("test/cache"))
+    bundle = tb.TaylorBundle(
+          filename = "test/tb_renderCache"
+        , curve = curve.Trochoid(-5, 0.6, 0)
+        , backend = "native"
+        , cache = "test/cache"
+        , n_tan = 100
+        , n_part = 2
+        , tanalpha = 0.3
+        , dpi = 30
+        , window = [-4,4,-2.25,2.25]
+        )
+    bundle.render()
+    first = entries()
+    image1 = matplotlib.pyplot.imread(bundle.filename + ".png")
+    bundle.render()
+    image2 = matplotlib.pyplot.imread(bundle.filename + ".png")
+    bundle.set_options(tanalpha = 0.5)
+    bundle.render()
+    # coefficients and polylines of 2 partials, their sum, and the curve
+    counts = [len(first), len(entries() - first)]
+    bundle.set_options(cache_size = 0, tanalpha = 0.7)
+    bundle.render()
+    return (image1 == image2).all() and counts == [6, 1] and entries() == set()
+
+# changing the curve or the background doesn't render the tangents again,
+# and gives the image of a new render
+def tb_layerRerender():
+    options = dict( curve = curve.Trochoid(-5, 0.6, 0)
+                  , backend = "native"
+                  , n_tan = 100
+                  , n_part = 2
+                  , tanalpha = 0.3
+                  , dpi = 30
+                  , window = [-4,4,-2.25,2.25]
+                  )
+    bundle = tb.TaylorBundle(filename = "test/tb_layerRerender", **options)
+    bundle.render()
+    partials = []
+    renderPartial = bundle.renderPartial
+    def countPartials(*args, **kwargs):
+        partials.append(args[2])
+        return renderPartial(*args, **kwargs)
+    bundle.renderPartial = countPartials
+    bundle.set_options(curvecol = "y", curvelw = 3, facecolor = "navy")
+    bundle.render()
+    image1 = matplotlib.pyplot.imread(bundle.filename + ".png")
+    fresh = tb.TaylorBundle( filename = "test/tb_layerRerender_fresh"
+                           , curvecol = "y", curvelw = 3, facecolor = "navy", **options)
+    fresh.render()
+    image2 = matplotlib.pyplot.imread(fresh.filename + ".png")
+    return partials == [] and (image1 == image2).all()
+
+# frames rendered in parallel are saved in order, and are the same as the
+# frames written to a pipe
+def tb_animationFrames():
+    bundle = tb.TaylorBundle(
+          filename = "test/tb_animationFrames"
+        , curve = curve.Trochoid(-5, 0.6, 0)
+        , backend = "native"
+        , n_tan = 100
+        , n_part = 2
+        , tanalpha = 0.3
+        , dpi = 30
+        , window = [-4,4,-2.25,2.25]
+        )
+    anim = animation.Animation( bundle, 4, workers = 2
+                              , curve = lambda t: curve.Trochoid(-5, 0.6, tb.tau*t)
+                              , curvecol = lambda t: (1, t, 0) )
+    anim.render()
+    saved = [ matplotlib.pyplot.imread(anim.frameFilename(i) + ".png")
+              for i in range(4) ]
+    pipe = io.BytesIO()
+    anim.workers = 1
+    anim.render(pipe)
+    frames = numpy.frombuffer(pipe.getvalue(), dtype=numpy.uint8).reshape((4,) + saved[0].shape)
+    return ( all((f == numpy.round(s*255)).all() for f, s in zip(frames, saved))
+             and not (saved[0] == saved[1]).all() )
+
+# drawing the tangents a chunk at a time gives the image of drawing them
+# all at once, and the chunks that fit in max_memory are smaller
+def tb_chunkedRender():
+    options = dict( curve = curve.Trochoid(-5, 0.6, 0)
+                  , n_tan = 300
+                  , tanalpha = 0.3
+                  , dpi = 20
+                  , window = [-4,4,-2.25,2.25]
+                  , keep_layers = False
+                  )
+    same = True
+    for backend in ("matplotlib", "native"):
+        bundle = tb.TaylorBundle(backend=backend, **options)
+        whole = bundle.renderImage()
+        bundle.set_options(chunk_size=70)
+        chunked = bundle.renderImage()
+        same = same and abs(whole - chunked).max() <= 1e-9
+    bundle.set_options(chunk_size=None)
+    estimate = bundle.estimate()
+    bundle.set_options(max_memory=estimate["memory"] - 1)
+    smaller = bundle.estimate()
+    # the sample is measured once for a whole render, and the chunks are
+    # sized for the tangents drawn
+    class Sampled(tb.TaylorBundle):
+        sampled = []
+        def _tangentCoefficients(self, tmin, tmax, n_tan, tcurve):
+            if n_tan == self.estimateSample:
+                self.sampled.append(n_tan)
+            return tb.TaylorBundle._tangentCoefficients(self, tmin, tmax, n_tan, tcurve)
+    sampled = Sampled(backend="native", max_memory=smaller["memory"], **options)
+    sampled.renderImage()
+    few = sampled.estimate(n_tan=100)
+    bundle.set_options(max_memory=1)
+    try:
+        bundle.renderImage()
+        raised = False
+    except MemoryError:
+        raised = True
+    return ( same and estimate["chunk"] == 300
+             and smaller["chunk"] < 300 and smaller["memory"] < estimate["memory"]
+             and len(Sampled.sampled) == 1 and few["chunk"] == 100
+             and few["seconds"] < smaller["seconds"] and raised )
+# the peak memory of a render chunked to fit max_memory stays within it
+def tb_peakMemory():
+    options = dict( n_tan = 2000
+                  , degree = 5
+                  , dpi = 60
+                  , window = [-4,4,-2.25,2.25]
+                  , backend = "native"
+                  , keep_layers = False
+                  , max_memory = 200 << 20
+                  )
+    bundle = tb.TaylorBundle(curve=curve.Trochoid(-5, 0.6, 0), **options)
+    # in a process of its own, which holds nothing of the other tests
+    script = ( "import resource, curve, taylorbundle as tb\n"
+               "tb.TaylorBundle(curve=curve.Trochoid(-5, 0.6, 0), **{!r}).renderImage()\n"
+               "print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)\n" ).format(options)
+    rss = int(subprocess.check_output( [sys.executable, "-c", script]
+                                     , cwd=os.path.dirname(os.path.abspath(__file__)) ))
+    # ru_maxrss is in kilobytes on linux, in bytes on mac
+    rss *= 1 if sys.platform == "darwin" else 1024
+    return bundle.estimate()["chunk"] < 2000 and rss <= options["max_memory"]
+
+# vertices in single precision give nearly the image of double precision
+def tb_float32Vertices():
+    bundle = tb.TaylorBundle( curve = curve.Trochoid(-5, 0.6, 0)
+                            , backend = "native"
+                            , degree = 3
+                            , n_tan = 300
+                            , tanalpha = 0.3
+                            , dpi = 20
+                            , window = [-4,4,-2.25,2.25]
+                            )
+    double = bundle.renderImage()
+    bundle.set_options(float32=True)
+    single = bundle.renderImage()
+    polylines, colors = bundle.tangentPolylines(0, tb.tau, 10, figsize=bundle.figsize)
+    return ( all(p.dtype == numpy.float32 for p in polylines)
+             and abs(double - single).max() <= 1/255.0 )
+
+# the point splat preview looks like the image, at a quarter of its size
+def tb_preview():
+    bundle = tb.TaylorBundle( filename = "test/tb_preview"
+                            , curve = curve.Trochoid(-5, 0.6, 0)
+                            , backend = "native"
+                            , n_tan = 300
+                            , tanalpha = 0.3
+                            , dpi = 20
+                            , window = [-4,4,-2.25,2.25]
+                            )
+    sketch = bundle.preview(scale=1, samples=64)
+    image = bundle.renderImage()
+    small = bundle.preview(save=True)
+    # the samples of each tangent are thinned to at most previewPoints
+    deposit = raster.Accumulator.deposit
+    counts = []
+    def counting(acc, pixels, density, rgb):
+        counts.append(density.size)
+        return deposit(acc, pixels, density, rgb)
+    raster.Accumulator.deposit = counting
+    try:
+        bundle.previewPoints = 3000
+        bundle.preview(samples=16)
+        bundle.previewPoints = 100
+        bundle.preview(samples=16)
+    finally:
+        raster.Accumulator.deposit = deposit
+    return ( sketch.shape == image.shape and abs(sketch - image).mean() < 0.05
+             and small.shape == (45, 80, 4)
+             and os.path.exists("test/tb_preview_preview0.25.png")
+             and counts == [3000, 300] )
+
+# a symmetric bundle drawn in part and mirrored gives the whole image, and
+# tangents of other colours on the other side aren't mirrored. (Straight
+# lines right on the border of two pixels go to either of them.)
+def tb_symmetricRender():
+    bundle = tb.TaylorBundle( curve = curve.Lissajous(1, 2, 3, 2, 0)
+                            , backend = "native"
+                            , degree = 2
+                            , n_tan = 100
+                            , n_part = 2
+                            , tanalpha = 0.3
+                            , dpi = 20
+                            , window = [-4,4,-2.25,2.25]
+                            )
+    whole = bundle.renderImage()
+    bundle.set_options(symmetry=True)
+    group = [name for name, perm in bundle.symmetryGroup(200)]
+    mirrored = bundle.renderImage()
+    bundle.set_options(symmetry=["mirrory"])
+    named = [name for name, perm in bundle.symmetryGroup(200)]
+    bundle.set_options(symmetry=True, tancol=colormix.mix2("b", "r", cosine(0, 1)))
+    colored = [name for name, perm in bundle.symmetryGroup(200)]
+    # a colour that differs at a single tangent breaks the symmetry
+    def spot(t):
+        colors = numpy.tile([0, 0, 1, 1.0], (numpy.size(t), 1))
+        colors[abs(numpy.ravel(t) - tb.tau/200) < 1e-9, 0] = 1
+        return colors
+    bundle.set_options(tancol=spot)
+    spotted = [name for name, perm in bundle.symmetryGroup(200)]
+    return ( group == [None, "mirrorx", "mirrory", "halfturn"]
+             and abs(whole - mirrored).max() <= 1e-9
+             and named == [None, "mirrory"] and colored == [None]
+             and spotted == [None] )
+
+# a sweep over degrees renders each degree as a render at that degree
+# would, from the coefficients of the highest
+def tb_degreeSweep():
+    bundle = tb.TaylorBundle( curve = curve.Lissajous(1, 2, 3, 2, 0)
+                            , backend = "native"
+                            , n_tan = 100
+                            , n_part = 2
+                            , tanalpha = 0.3
+                            , dpi = 20
+                            , window = [-4,4,-2.25,2.25]
+                            , filename = "test/tb_degreeSweep"
+                            )
+    same = True
+    for options in ({}, {"clip": False, "tanerror": None}, {"backend": "matplotlib"}):
+        bundle.set_options(**options)
+        images = bundle.renderDegrees([3, 2, 4])
+        for k, img in zip([2, 3, 4], images):
+            bundle.set_options(degree=k)
+            same = same and abs(bundle.renderImage() - img).max() <= 1e-6
+            same = same and os.path.exists("test/tb_degreeSweep_degree{}.png".format(k))
+    (h, w) = images[0].shape[:2]
+    bundle.renderDegrees([1, 2, 3], sheet=True, columns=3)
+    sheet = matplotlib.pyplot.imread("test/tb_degreeSweep_degrees.png")
+    # the buffers are saved with hdr, and what it can't do is refused
+    bundle.set_options(backend="native", hdr=True)
+    bundle.renderDegrees([2])
+    buf = numpy.load("test/tb_degreeSweep_degree2.npy")
+    refused = 0
+    for options in ({"workers": 2}, {"symmetry": True}, {"max_tile_pixels": 1000}):
+        try:
+            tb.TaylorBundle( curve = bundle.curve, dpi = 20, window = bundle.window
+                           , **options ).renderDegrees([1, 2])
+        except ValueError:
+            refused += 1
+    return ( same and sheet.shape[:2] == (h, 3*w + 2*max(1, h//50))
+             and buf.shape == (h, w, 4) and refused == 3 )
+
+# a batch renders its jobs, and running it again only renders the jobs
+# that changed
+def tb_batchResume():
+    spec = { "defaults": { "n_tan": 50, "dpi": 20, "backend": "native"
+                         , "window": [-4,4,-2.25,2.25] }
+           , "jobs": [ { "filename": "test/tb_batchResume{}".format(i)
+                       , "curve": {"type": "Trochoid", "args": [-5, 0.6, i]}
+                       , "tancol": { "type": "mix2"
+                                   , "args": ["b", "r", {"type": "cosine", "args": [0, 1]}] } }
+                       for i in range(3) ]
+           }
+    # start without the ledger and images of an earlier run
+    for fname in ["test/tb_batchResume.ledger"] + [j["filename"] + ".png" for j in spec["jobs"]]:
+        if os.path.exists(fname):
+            os.remove(fname)
+    ledger = batch.Ledger("test/tb_batchResume.ledger")
+    log = open(os.devnull, "w")
+    def run():
+        with open("test/tb_batchResume.json", "w") as f:
+            json.dump(spec, f)
+        jobs = batch.loadJobs("test/tb_batchResume.json")
+        report = batch.runBatch(jobs, workers=2, ledger=ledger, log=log)
+        return [r["status"] for r in report]
+    first = run()
+    second = run()
+    spec["jobs"][1]["tanlw"] = 2
+    third = run()
+    return ( first == ["done"]*3 and second == ["skipped"]*3
+             and third == ["skipped", "done", "skipped"] )
+
 # TODO: what happens when n_parts is 0?
 
+###############################################################################
+## Rasterizer
+
+# the density of a line inside the image is its area times its density
+def r_lineDensity():
+    acc = raster.Accumulator((20, 30), (0, 30, 0, 20))
+    acc.addPolylines( numpy.array([[[3, 4], [25, 15]]], dtype=float)
+                    , [[1, 0, 0, 0.5]], width=2 )
+    area = 2 * numpy.hypot(22, 11)
+    return abs(acc.density.sum() - area*numpy.log(2)) < 1e-9
+# a line deposits the area it covers in each pixel, across its width
+def r_pixelCoverage():
+    # lines on and next to the pixel borders
+    acc = raster.Accumulator((4, 4), (0, 4, 0, 4))
+    acc.addSegments( numpy.array([[0.0, 1+1e-9], [2.7, 0.0]])
+                   , numpy.array([[4.0, 1+1e-9], [2.7, 4.0]])
+                   , numpy.array([[1, 1, 1, 0.5]]*2), width=0.8 )
+    cov_ = numpy.zeros((4, 4))
+    cov_[:2] += 0.4
+    cov_[:,2] += 0.7
+    cov_[:,3] += 0.1
+    ok = numpy.allclose(acc.density / numpy.log(2), cov_)
+    # a sloped line through the whole image, against the supersampled area
+    (p0, p1) = (numpy.array([-1.0, 0.3]), numpy.array([5.0, 3.1]))
+    (ys, xs) = (numpy.mgrid[0:400, 0:400] + 0.5) / 100
+    d = (p1 - p0) / numpy.hypot(*(p1 - p0))
+    for width in (0.2, 0.6, 1.0):
+        acc = raster.Accumulator((4, 4), (0, 4, 0, 4))
+        acc.addSegments(p0[None], p1[None], numpy.array([[1, 1, 1, 0.5]]), width)
+        inside = abs((ys - p0[1])*d[0] - (xs - p0[0])*d[1]) <= width / 2.0
+        cov_ = inside.reshape(4, 100, 4, 100).mean(axis=(1, 3))
+        ok &= abs(acc.density / numpy.log(2) - cov_).max() < 1e-3
+    return ok
+# the image doesn't depend on the order of the lines
+def r_orderIndependent():
+    lines = numpy.random.rand(50, 3, 2) * 10
+    colors = numpy.random.rand(50, 4)
+    acc1 = raster.Accumulator((10, 10), (0, 10, 0, 10))
+    acc1.addPolylines(lines, colors, 1.5)
+    acc2 = raster.Accumulator((10, 10), (0, 10, 0, 10))
+    acc2.addPolylines(lines[::-1], colors[::-1], 1.5)
+    return numpy.allclose(acc1.image(), acc2.image(), rtol=0, atol=1e-9)
+# a pixel covered by a line of alpha a has opacity a
+def r_coverageOpacity():
+    acc = raster.Accumulator((1, 1), (0, 1, 0, 1))
+    acc.splat(numpy.array([[0.5, 0.5]]), numpy.array([-numpy.log(0.7)]),
+              numpy.array([[0, 1, 0]]))
+    img = acc.image("k")
+    return abs(acc.opacity()[0,0] - 0.3) < 1e-12 and verysmall(img[0,0] - [0, 0.3, 0, 1])
+# lines far beyond the image are clipped to it before they are split at
+# the pixel grid, and lines with non-finite ends are dropped
+def r_clippedLines():
+    acc = raster.Accumulator((3, 4), (0, 4, 0, 3))
+    p0 = numpy.array([[-1e9, 1.5], [0.5, 0.5], [numpy.nan, 1.0]])
+    p1 = numpy.array([[1e9, 1.5], [numpy.inf, 0.5], [2.0, 1.0]])
+    acc.addSegments(p0, p1, numpy.array([[1, 1, 1, 0.5]]*3), width=0.5)
+    cov = acc.density / numpy.log(2) / 0.5
+    cov_ = numpy.zeros((3, 4))
+    cov_[1] = 1
+    return ( numpy.allclose(cov, cov_, rtol=0, atol=1e-6)
+             and numpy.isfinite(acc.buffer).all() )
+
 ###############################################################################
 ## TB option setter
 
@@ -723,6 +1239,7 @@ def cm_tests(v=3):
 def misc_tests(v=3):
     testAll( [ misc_permute_nonDuplicateEntries
              , misc_permute_rightOrder
+             , misc_fingerprint_values
              ]
            , v = v
            )
@@ -757,6 +1274,33 @@ def tb_render_tests(v=3):
              , tb_variableTanAlpha_highWhenIncreasing
              , tb_variableCurveAlpha_highWhenIncreasing
              , tb_unidirectioanlTangents
+             , tb_nativeBackend
+             , tb_parallelNativeRender
+             , tb_parallelMatplotlibRender
+             , tb_keepPartials
+             , tb_tiledNativeRender
+             , tb_progressiveRender
+             , tb_hdrBuffer
+             , tb_renderCache
+             , tb_layerRerender
+             , tb_animationFrames
+             , tb_chunkedRender
+             , tb_peakMemory
+             , tb_float32Vertices
+             , tb_preview
+             , tb_symmetricRender
+             , tb_degreeSweep
+             , tb_batchResume
+             ]
+           , v = v
+           )
+
+def raster_tests(v=3):
+    testAll( [ r_lineDensity
+             , r_pixelCoverage
+             , r_orderIndependent
+             , r_coverageOpacity
+             , r_clippedLines
              ]
            , v = v
            )
@@ -797,5 +1341,6 @@ if __name__ == "__main__":
     tb_tests(v=v)
     cm_tests(v=v)
     misc_tests(v=v)
+    raster_tests(v=v)
     cm_render_tests(v=v)
     tb_render_tests(v=v)
\ No newline at end of file